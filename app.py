@@ -12,5 +12,73 @@ manage = Manager(app)
 Migrate(app, db)
 manage.add_command('db', MigrateCommand)
 
+
+@manage.command
+def rebuild_booking_index():
+    """根据历史订单重建房屋预订日期索引"""
+    from ihome_api.utils import availability
+    count = availability.rebuild_index()
+    print('rebuild booking index: %s days' % count)
+
+
+@manage.command
+def rebuild_house_listing():
+    """根据数据库重建房屋列表的redis有序集合"""
+    from ihome_api.utils import house_listing
+    count = house_listing.rebuild()
+    print('rebuild house listing: %s houses' % count)
+
+
+@manage.command
+def rebuild_facility_index():
+    """根据数据库重建房屋设施和城区的位图索引"""
+    from ihome_api.utils import facility_index
+    count = facility_index.rebuild()
+    print('rebuild facility index: %s houses' % count)
+
+
+@manage.command
+def rebuild_house_search():
+    """根据数据库重建房屋标题和地址的检索索引"""
+    from ihome_api.utils import house_search
+    count = house_search.rebuild()
+    print('rebuild house search: %s houses' % count)
+
+
+@manage.command
+def expire_orders():
+    """取消超过接单或支付期限的订单"""
+    from ihome_api.utils import order_expiry
+    count = order_expiry.expire_orders()
+    print('expire orders: %s orders' % count)
+
+
+@manage.command
+def rebuild_order_stats():
+    """根据历史订单重建房屋的月度统计"""
+    from ihome_api.utils import order_stats
+    count = order_stats.rebuild()
+    print('rebuild order stats: %s orders' % count)
+
+
+@manage.command
+def explain_queries():
+    """用 EXPLAIN 检查接口的主要查询是否使用了索引"""
+    from ihome_api.utils import explain
+    for name, details, full_scan in explain.check():
+        print('%s %s' % ('FULL SCAN' if full_scan else 'ok       ', name))
+        for detail in details:
+            print('    %s' % detail)
+
+
+@manage.command
+def redis_pool_stats():
+    """查看各进程最近记录的redis连接池使用情况"""
+    from ihome_api import redis_store
+    from ihome_api.utils import redis_pool
+    for worker, stats in sorted(redis_pool.all_stats(redis_store).items()):
+        print('%s %s' % (worker, ' '.join('%s=%s' % item for item in sorted(stats.items()))))
+
+
 if __name__ == '__main__':
     manage.run()
@@ -0,0 +1,59 @@
+# coding:utf-8
+"""模拟登录高峰：16 个请求线程中一半在登录，另一半处理普通请求，
+比较直接在请求线程中计算和使用线程池时的登录吞吐量和普通请求的延迟
+
+在项目根目录运行：
+    python -m bench.password
+"""
+import threading
+import time
+from flask import Flask
+from werkzeug.security import generate_password_hash, check_password_hash
+from ihome_api.utils import password
+
+SECONDS = 5
+
+app = Flask(__name__)
+app.config.update(PASSWORD_HASH_METHOD='pbkdf2:sha256:150000', PASSWORD_HASH_SALT_LENGTH=8,
+                  PASSWORD_HASH_WORKERS=2, PASSWORD_HASH_QUEUE_SIZE=64, PASSWORD_HASH_TIMEOUT=30)
+password.init_app(app)
+stored = generate_password_hash('password', 'pbkdf2:sha256:150000')
+
+
+def other_request():
+    # 普通请求，主要是python代码
+    return sum(i * i for i in range(20000))
+
+
+def bench(verify):
+    stop = time.time() + SECONDS
+    logins = []
+    latencies = []
+
+    def login_worker():
+        with app.app_context():
+            while time.time() < stop:
+                verify(stored, 'password')
+                logins.append(1)
+
+    def other_worker():
+        while time.time() < stop:
+            start = time.time()
+            other_request()
+            latencies.append(time.time() - start)
+
+    threads = [threading.Thread(target=login_worker) for _ in range(8)]
+    threads += [threading.Thread(target=other_worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return (len(logins) / float(SECONDS), latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.99)] * 1000)
+
+
+if __name__ == '__main__':
+    for name, verify in (('inline', check_password_hash), ('pool', password.verify_password)):
+        throughput, p50, p99 = bench(verify)
+        print('%-6s logins %6.1f/s  other requests p50 %6.2f ms  p99 %6.2f ms' % (name, throughput, p50, p99))
@@ -0,0 +1,34 @@
+# coding:utf-8
+"""比较各json序列化实现序列化 1000 个房屋的列表页的耗时，并检查输出是否一致
+
+在项目根目录运行：
+    python -m bench.serializer
+"""
+import datetime
+import timeit
+from ihome_api.utils import serializer
+
+now = datetime.datetime(2019, 11, 13, 12, 30, 0)
+houses = [{
+    'house_id': i,
+    'title': '阳光小区两室一厅 %s 号' % i,
+    'price': 100 * (i % 50 + 1),
+    'area_name': '东城区',
+    'img_url': 'http://q0xqm4j0m.bkt.clouddn.com/house_%s.jpg' % i,
+    'room_count': i % 5 + 1,
+    'order_count': i % 97,
+    'address': '北京市东城区某某路 %s 号' % i,
+    'user_avatar': '',
+    'ctime': (now - datetime.timedelta(days=i % 30)).strftime('%Y-%m-%d'),
+} for i in range(1000)]
+page = {'errno': '0', 'errmsg': 'ok', 'data': {'total_page': 1, 'current_page': 1, 'houses': houses}}
+
+
+if __name__ == '__main__':
+    outputs = {}
+    for name in sorted(serializer.BACKENDS):
+        serializer.set_backend(name)
+        outputs[name] = serializer.dumps(page)
+        seconds = min(timeit.repeat(lambda: serializer.dumps(page), number=100, repeat=5)) / 100
+        print('%-8s %8.3f ms/page  %d bytes' % (name, seconds * 1000, len(outputs[name].encode('utf-8'))))
+    print('identical output: %s' % (len(set(outputs.values())) == 1))
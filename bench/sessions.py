@@ -0,0 +1,45 @@
+# coding:utf-8
+"""比较各会话模式下已登录请求（GET /api/v1.0/sessions）的耗时
+
+需要本地的redis，使用第15号库，该接口不查询数据库。在项目根目录运行：
+    python -m bench.sessions
+"""
+import timeit
+import config
+
+MODES = (
+    ('redis', {'SESSION_MODE': 'redis'}),
+    ('cookie', {'SESSION_MODE': 'cookie', 'SESSION_REVOCATION': True}),
+    ('cookie, no revocation', {'SESSION_MODE': 'cookie', 'SESSION_REVOCATION': False}),
+)
+NUMBER = 2000
+
+
+class BenchConfig(config.Config):
+    REDIS_DB = 15
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+def bench(options):
+    from ihome_api import create_app
+
+    class ModeConfig(BenchConfig):
+        pass
+
+    for name, value in options.items():
+        setattr(ModeConfig, name, value)
+    config.config_map['bench'] = ModeConfig
+    app = create_app('bench')
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['name'] = 'bench'
+        sess['mobile'] = '13800000000'
+    resp = client.get('/api/v1.0/sessions').get_json()
+    assert resp['errmsg'] == 'true', resp
+    return min(timeit.repeat(lambda: client.get('/api/v1.0/sessions'), number=NUMBER, repeat=3)) / NUMBER
+
+
+if __name__ == '__main__':
+    for mode, options in MODES:
+        print('%-22s %.3f ms/request' % (mode, bench(options) * 1000))
@@ -1,5 +1,4 @@
 # coding:utf-8
-import redis
 
 
 class Config(object):
@@ -19,16 +18,45 @@ class Config(object):
                                                                            PORT,
                                                                            DATABASE)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 只读副本，配置 'replica' 后只读接口的查询使用副本，如 {'replica': 'mysql+pymysql://...'}
+    SQLALCHEMY_BINDS = {}
 
-    redis
+    # redis
     REDIS_HOST = '127.0.0.1'
     REDIS_PORT = 6379
+    REDIS_DB = 0
+    # 每个进程的连接池最多创建的连接数，用完时等待空闲连接
+    REDIS_MAX_CONNECTIONS = 50
+    # 等待空闲连接的超时时间，单位秒
+    REDIS_POOL_TIMEOUT = 5
+    # 读写和建立连接的超时时间，单位秒
+    REDIS_SOCKET_TIMEOUT = 5
+    REDIS_SOCKET_CONNECT_TIMEOUT = 2
+    # 连接空闲超过该时间后，使用前先发送PING检查，单位秒
+    REDIS_HEALTH_CHECK_INTERVAL = 30
 
-    # flask-session配置
+    # flask-session配置，SESSION_REDIS 在 create_app 中设置为与 redis_store 共用连接池的客户端
     SESSION_TYPE = 'redis'
-    SESSION_REDIS = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT)
     SESSION_USE_SIGNER = True  # 对cookie中的session_id进行隐藏处理
     PERMANENT_SESSION_LIFETIME = 86400  # session数据的有效期
+    # 会话模式：'redis' 会话数据保存在redis中；'cookie' 会话数据签名后保存在cookie中，验证登录不需要查询redis
+    SESSION_MODE = 'redis'
+    # cookie 模式下退出登录后吊销会话，每个请求检查一次redis中的吊销列表
+    SESSION_REVOCATION = True
+
+    # 密码哈希算法和迭代次数，修改后旧密码在用户下次登录时重新计算
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:150000'
+    PASSWORD_HASH_SALT_LENGTH = 8
+    # 计算密码哈希的线程数，限制同时占用的CPU
+    PASSWORD_HASH_WORKERS = 4
+    # 最多排队的密码计算数，等待超过 PASSWORD_HASH_TIMEOUT 秒返回繁忙
+    PASSWORD_HASH_QUEUE_SIZE = 32
+    PASSWORD_HASH_TIMEOUT = 5
+
+    # 接口限流，关闭后所有限制都放行
+    RATE_LIMIT_ENABLED = True
+    # 按名称覆盖默认的限制，值为 (次数, 时间窗口秒数)，如 {'image_codes_ip': (30, 60)}
+    RATE_LIMITS = {}
 
 
 class DevelopmentConfig(Config):
@@ -2,18 +2,20 @@
 
 from flask import Flask
 from config import config_map
-from flask_sqlalchemy import SQLAlchemy
 from flask_session import Session
 from flask_wtf import CSRFProtect
 from logging.handlers import TimedRotatingFileHandler
 from os import path
 from ihome_api.utils.commons import ReConverter
+from ihome_api.utils.routing import RoutingSQLAlchemy
+from ihome_api.utils import redis_pool, sessions, password
 import time
 import redis
+from ihome_api import contants
 import logging
 
-# 数据库
-db = SQLAlchemy()
+# 数据库，配置了只读副本时只读视图的查询使用副本
+db = RoutingSQLAlchemy()
 # 创建redis连接对象
 redis_store = None
 
@@ -49,10 +51,22 @@ def create_app(config_name):
     # 初始化数据库
     db.init_app(app)
     global redis_store
-    redis_store = redis.StrictRedis(host=config_class.REDIS_HOST, port=config_class.REDIS_PORT)
+    # flask-session 与 redis_store 共用一个连接池
+    redis_store = redis.StrictRedis(connection_pool=redis_pool.create_pool(app.config))
+    app.config['SESSION_REDIS'] = redis_store
 
     # 利用flask-session将
     Session(app)
+    # 配置为签名cookie会话时替换flask-session
+    sessions.init_app(app)
+    # 密码哈希在有界线程池中计算
+    password.init_app(app)
+
+    # 定期记录本进程的redis连接池使用情况
+    @app.after_request
+    def report_redis_pool_stats(response):
+        redis_pool.report_stats(redis_store, contants.REDIS_POOL_STATS_INTERVAL, contants.REDIS_POOL_STATS_EXPIRES)
+        return response
 
     # 为flask补充csrf防护
     CSRFProtect(app)
@@ -3,11 +3,14 @@
 from . import api
 from flask import request, g, current_app, jsonify, session
 from ihome_api import contants, db, redis_store
-from ihome_api.utils.commons import login_required
-from ihome_api.models import User, House, Area, Facility, HouseImage, Order
+from ihome_api.utils.commons import login_required, current_user
+from ihome_api.utils.routing import read_only, on_replica, use_primary
+from ihome_api.models import House, Area, Facility, HouseImage
 from ihome_api.utils.response_code import RET
-from flask import json
 from ihome_api.utils.image_storage import storage
+from ihome_api.utils import availability, pagination, house_listing, facility_index, house_search, cache, serializer
+from ihome_api.utils.preload import houses_to_basic_dicts
+from sqlalchemy import false
 from datetime import datetime
 import os
 
@@ -18,51 +21,43 @@ def get_houses():
     """获取用户的房源信息"""
     user_id = g.user_id
     try:
-        user = User.query.filter_by(id=user_id).first()
+        user = current_user()
+        houses = House.query.filter(House.user_id == user_id).all() if user is not None else []
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='数据库连接错误')
     if user is None:
         return jsonify(errno=RET.USERERR, errmsg='用户不存在')
-    houses = user.houses
-    # 将查询到的房屋信息转换为字典存放到列表中
-    houses_list = []
-    if houses:
-        for house in houses:
-            houses_list.append(house.to_basic_dict())
-    return jsonify(errno=RET.OK, errmsg='查询房屋成功', data={'houses': houses_list})
+    # 将查询到的房屋信息转换为字典存放到列表中，批量加载城区和房东信息
+    houses_list = houses_to_basic_dicts(houses)
+    return serializer.jsonify(errno=RET.OK, errmsg='查询房屋成功', data={'houses': houses_list})
+
+
+def build_areas_json():
+    """从数据库查询城区信息，转换为json字符串"""
+    areas = Area.query.all()
+    area_dict = []
+    for area in areas:
+        area_dict.append(area.to_dict_area())
+    return serializer.dumps(area_dict)
 
 
 @api.route('/areas', methods=['GET'])
+@read_only
 def get_areas():
     """获取城区信息"""
-    # 尝试从redis中获取城区信息
+    # 客户端带有ETag时只读取ETag，数据未变化直接返回304
+    if request.if_none_match:
+        etag = cache.get_refresh_ahead_etag('areas_info', build_areas_json, contants.AREAS_REDIS_EXPIRES)
+        if cache.is_not_modified(etag):
+            return cache.not_modified_response(etag)
+    # 从redis中获取城区信息，缓存临近过期时由一个请求在后台刷新，其余请求继续使用缓存
     try:
-        areas_json = redis_store.get('areas_info')
+        areas_json, etag = cache.get_refresh_ahead('areas_info', build_areas_json, contants.AREAS_REDIS_EXPIRES)
     except Exception as e:
         current_app.logger.error(e)
-    if areas_json is None:
-        # 从数据库获取城区信息
-        try:
-            areas = Area.query.all()
-        except Exception as e:
-            current_app.logger.error(e)
-            return jsonify(errno=RET.DBERR, errmsg='数据库连接异常')
-        area_dict = []
-        for area in areas:
-            area_dict.append(area.to_dict_area())
-        areas_json = json.dumps(area_dict)
-        # 存储到redis中
-        try:
-            redis_store.setex('areas_info', contants.AREAS_REDIS_EXPIRES, value=areas_json)
-        except Exception as e:
-            current_app.logger.error(e)
-    else:
-        # 表示redis中有缓存，直接使用的是缓存数据
-        areas_json = areas_json.decode("utf-8")
-        current_app.logger.info("hit redis cache area info")
-    return '{"errno": 0, "errmsg": "查询城区信息成功", "data":{"areas": %s}}' % areas_json, 200, {
-        "Content-Type": "application/json"}
+        return jsonify(errno=RET.DBERR, errmsg='数据库连接异常')
+    return cache.json_response('{"errno": 0, "errmsg": "查询城区信息成功", "data":{"areas": %s}}' % areas_json, etag)
 
 
 @api.route('/houses/info', methods=['POST'])
@@ -142,6 +137,14 @@ def set_houses_info():
         db.session.rollback()
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg="数据库错误")
+    # 清除该房屋编号的负缓存，将新房源加入列表的有序集合和设施位图索引
+    try:
+        cache.invalidate('house_missing_%s' % house.id, 'house_info_%s' % house.id)
+        house_listing.index_house(house)
+        facility_index.index_house(house)
+        house_search.index_house(house)
+    except Exception as e:
+        current_app.logger.error(e)
     return jsonify(errno=RET.OK, errmsg='发布房源成功', data={'house_id': house.id})
 
 
@@ -184,16 +187,30 @@ def set_houses_image():
     )
     db.session.add(house_image)
     # 设置房屋的主图片
+    index_image_changed = False
     if house.index_image_url == '':
         house.index_image_url = avatar_url
         current_app.logger.info('house % s' % house.__dict__)
         db.session.add(house)
+        index_image_changed = True
     try:
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='数据库异常')
+    # 主图片变化后更新列表中的房屋数据和首页排行
+    if index_image_changed:
+        try:
+            house_listing.index_house(house)
+            cache.expire_refresh_ahead('home_page_data')
+        except Exception as e:
+            current_app.logger.error(e)
+    # 删除各进程中的房屋详情缓存
+    try:
+        cache.invalidate('house_info_%s' % house.id)
+    except Exception as e:
+        current_app.logger.error(e)
     # image_url = contants.QINIU_URL_DOMAIN + file_name
     return jsonify(errno=RET.OK, errmsg='保存成功', data={'image_url': avatar_url})
 
@@ -215,7 +232,12 @@ def set_houses_image():
 #     return jsonify(errno=RET.OK, errmsg='查询成功', data={'user_id':user_id,'house': house.to_basic_dict()})
 
 
+# 进程内的房屋详情缓存，热门房屋不需要访问redis
+house_info_cache = cache.LocalCache(contants.HOUSE_DETAIL_LOCAL_CACHE_SIZE, contants.HOUSE_DETAIL_LOCAL_CACHE_EXPIRES)
+
+
 @api.route("/houses/<int:house_id>", methods=["GET"])
+@read_only
 def get_house_detail(house_id):
     """获取房屋详情"""
     # 前端在房屋详情页面展示时，如果浏览页面的用户不是该房屋的房东，则展示预定按钮，否则不展示，
@@ -227,48 +249,136 @@ def get_house_detail(house_id):
     if not house_id:
         return jsonify(errno=RET.PARAMERR, errmsg="参数错误")
 
-    # 先从redis缓存中获取信息
-    try:
-        ret = redis_store.get("house_info_%s" % house_id)
-    except Exception as e:
-        current_app.logger.error(e)
-        ret = None
-    if ret:
+    # 先从进程内缓存中获取，再从redis缓存中获取信息，同时检查房屋不存在的负缓存
+    # 进程内缓存保存的是 (json字符串, ETag)
+    cache.start_invalidate_subscriber()
+    redis_key = "house_info_%s" % house_id
+    missing_key = "house_missing_%s" % house_id
+    cached = house_info_cache.get(redis_key)
+    if cached is None and request.if_none_match:
+        # 客户端带有ETag时只读取ETag，数据未变化直接返回304
+        try:
+            etag = redis_store.get(cache.etag_key(redis_key))
+        except Exception as e:
+            current_app.logger.error(e)
+            etag = None
+        if etag:
+            # 返回的数据中包含当前登录用户，ETag也需要区分用户
+            etag = '%s-%s' % (etag.decode('utf-8'), user_id)
+            if cache.is_not_modified(etag):
+                return cache.not_modified_response(etag)
+    if cached is None:
+        try:
+            pipeline = redis_store.pipeline(transaction=False)
+            pipeline.get(redis_key)
+            pipeline.get(cache.etag_key(redis_key))
+            pipeline.exists(missing_key)
+            ret, etag, missing = pipeline.execute()
+        except Exception as e:
+            current_app.logger.error(e)
+            ret, etag, missing = None, None, False
+        if ret:
+            cached = (ret.decode('utf-8'), etag.decode('utf-8') if etag else cache.make_etag(ret))
+            house_info_cache.set(redis_key, cached)
+        elif missing:
+            cached = cache.MISSING
+            house_info_cache.set(redis_key, cached)
+    if cached is cache.MISSING:
+        cache.incr_stat('negative_hit_house')
+        return jsonify(errno=RET.NODATA, errmsg="房屋不存在")
+    if cached:
         current_app.logger.info("hit house info redis")
-        return '{"errno":"0", "errmsg":"OK", "data":{"user_id":%s, "house":%s}}' % (user_id, ret), 200, {
-            "Content-Type": "application/json"}
+        ret, etag = cached
+        etag = '%s-%s' % (etag, user_id)
+        if cache.is_not_modified(etag):
+            return cache.not_modified_response(etag)
+        return cache.json_response(
+            '{"errno":"0", "errmsg":"OK", "data":{"user_id":%s, "house":%s}}' % (user_id, ret), etag)
 
     # 查询数据库
     try:
         house = House.query.get(house_id)
+        if house is None and on_replica():
+            # 刚发布的房屋可能还没有同步到只读副本，记录负缓存之前到主库确认
+            use_primary()
+            house = House.query.get(house_id)
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg="查询数据失败")
 
     if not house:
+        # 记录负缓存，短时间内重复请求不存在的房屋不再查询数据库
+        try:
+            redis_store.setex(missing_key, contants.NEGATIVE_CACHE_EXPIRES, 1)
+        except Exception as e:
+            current_app.logger.error(e)
+        house_info_cache.set(redis_key, cache.MISSING)
+        cache.incr_stat('negative_miss_house')
         return jsonify(errno=RET.NODATA, errmsg="房屋不存在")
 
     # 将房屋对象数据转换为字典
     try:
-        house_data = bytes.decode(house.to_full_dict())
+        house_data = house.to_full_dict()
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DATAERR, errmsg="数据出错")
 
-    # 存入到redis中
-    json_house = json.dumps(house_data)
+    # 存入到redis中，同时保存ETag
+    json_house = serializer.dumps(house_data)
+    etag = cache.make_etag(json_house)
     try:
-        redis_store.setex("house_info_%s" % house_id, contants.HOUSE_DETAIL_REDIS_EXPIRE_SECOND, json_house)
+        pipeline = redis_store.pipeline()
+        pipeline.setex(redis_key, contants.HOUSE_DETAIL_REDIS_EXPIRE_SECOND, json_house)
+        pipeline.setex(cache.etag_key(redis_key), contants.HOUSE_DETAIL_REDIS_EXPIRE_SECOND, etag)
+        pipeline.execute()
     except Exception as e:
         current_app.logger.error(e)
-
-    resp = '{"errno":"0", "errmsg":"OK", "data":{"user_id":%s, "house":%s}}' % (user_id, json_house), 200, {
-        "Content-Type": "application/json"}
-    return resp
+    house_info_cache.set(redis_key, (json_house, etag))
+
+    return cache.json_response(
+        '{"errno":"0", "errmsg":"OK", "data":{"user_id":%s, "house":%s}}' % (user_id, json_house),
+        '%s-%s' % (etag, user_id))
+
+
+# 进程内的城区编号校验结果，城区基本不会变化
+area_cache = cache.LocalCache(contants.AREA_LOCAL_CACHE_SIZE, contants.NEGATIVE_CACHE_EXPIRES)
+
+
+def check_area(area_id):
+    """判断城区是否存在，不存在的城区编号在redis中记录负缓存"""
+    cache_key = 'area_%s' % area_id
+    exists = area_cache.get(cache_key)
+    if exists is None:
+        missing_key = 'area_missing_%s' % area_id
+        if redis_store.exists(missing_key):
+            exists = False
+            cache.incr_stat('negative_hit_area')
+        else:
+            exists = Area.query.get(area_id) is not None
+            if not exists:
+                redis_store.setex(missing_key, contants.NEGATIVE_CACHE_EXPIRES, 1)
+                cache.incr_stat('negative_miss_area')
+        area_cache.set(cache_key, exists)
+    elif not exists:
+        cache.incr_stat('negative_hit_area')
+    return exists
+
+
+# 列表页各排序方式对应的排序字段，最后以房屋编号保证顺序唯一，(字段, 是否降序)
+HOUSE_LIST_SORT_COLUMNS = {
+    'new': [(House.create_time, True), (House.id, True)],  # 新旧
+    'booking': [(House.order_count, True), (House.id, True)],  # 入住最多
+    'price-inc': [(House.price, False), (House.id, False)],  # 价格由低到高
+    'price-des': [(House.price, True), (House.id, True)],  # 价格由高到低
+}
 
 
 # GET /api/v1.0/houses?sd=&ed=&aid=&sk=&p=
+# GET /api/v1.0/houses?sd=&ed=&aid=&sk=&cursor=  游标分页，首页传空的cursor
+# GET /api/v1.0/houses?...&fac=1,3  按设施筛选，同时返回其余设施的分面计数
+# GET /api/v1.0/houses?...&kw=  按标题和地址检索
 @api.route('/houses', methods=['GET'])
+@read_only
 def get_house_list():
     """获取房屋的列表信息（搜索页面）"""
     # 1. 获取参数
@@ -277,6 +387,9 @@ def get_house_list():
     area_id = request.args.get('aid', '')
     sort_key = request.args.get('sk', 'new')
     page = request.args.get('p')
+    cursor = request.args.get('cursor')  # 传入cursor参数时使用游标分页
+    facility_ids = request.args.get('fac', '')  # 要求具备的设施编号，逗号分隔
+    keyword = request.args.get('kw', '').strip()  # 检索关键词
 
     # 2. 校验参数
     # 2.1 处理时间
@@ -293,131 +406,190 @@ def get_house_list():
     # 2.2 判断区域ID
     if area_id:
         try:
-            area = Area.query.get(area_id)
+            area_exists = check_area(area_id)
         except Exception as e:
             current_app.logger.error(e)
             return jsonify(errno=RET.PARAMERR, errmsg='区域参数错误')
+        if not area_exists:
+            return jsonify(errno=RET.PARAMERR, errmsg='区域参数错误')
     # 2.3 处理页数
-    if page:
+    try:
+        page = int(page) if page else 1
+    except Exception as e:
+        current_app.logger.error(e)
+        page = 1
+    # 页数从1开始，有序集合的下标为负数时会从末尾读取
+    page = max(page, 1)
+    # 2.4 处理设施
+    try:
+        facility_ids = sorted(set(int(facility_id) for facility_id in facility_ids.split(',') if facility_id))
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.PARAMERR, errmsg='设施参数错误')
+    if sort_key not in HOUSE_LIST_SORT_COLUMNS:
+        sort_key = 'new'
+    sort_columns = HOUSE_LIST_SORT_COLUMNS[sort_key]
+    if cursor:
+        try:
+            pagination.decode_cursor(cursor, sort_columns)
+        except ValueError as e:
+            current_app.logger.error(e)
+            return jsonify(errno=RET.PARAMERR, errmsg='分页参数错误')
+    # 同一筛选条件下的页面缓存在同一个哈希中，游标分页的页面以c_开头
+    page_field = page if cursor is None else 'c_%s' % cursor
+
+    # 不带日期筛选的分页列表直接从redis有序集合中读取，索引未就绪时回退到数据库查询
+    if cursor is None and not start_date and not end_date and not facility_ids and not keyword:
         try:
-            page = int(page)
+            # 客户端的ETag与有序集合的版本一致时直接返回304，不读取房屋数据
+            ret = house_listing.query_page(area_id, sort_key, page, contants.HOUSE_LIST_PAGE_CAPACITY,
+                                           cache.is_not_modified)
         except Exception as e:
             current_app.logger.error(e)
-            page = 1
+            ret = None
+        if ret is not None:
+            total_page, cards, etag = ret
+            if cards is None:
+                return cache.not_modified_response(etag)
+            resp_json = '{"errno": "0", "errmsg": "ok", "data": {"total_page": %s, "current_page": %s, "houses": [%s]}}' % (
+                total_page, page, ','.join(cards))
+            if etag is None:
+                etag = cache.make_etag(resp_json)
+                if cache.is_not_modified(etag):
+                    return cache.not_modified_response(etag)
+            return cache.json_response(resp_json, etag)
 
     # 使用 redis 缓存数据
     redis_key = 'house_%s_%s_%s_%s' % (start_date, end_date, area_id, sort_key)
+    if facility_ids:
+        redis_key += '_fac_%s' % '-'.join(str(facility_id) for facility_id in facility_ids)
+    if keyword:
+        redis_key += '_kw_%s' % keyword
+    # 页面的ETag保存在同一个哈希中，以etag_开头
+    etag_field = 'etag_%s' % page_field
     try:
-        resp_json = redis_store.hget(redis_key, page)
+        if request.if_none_match:
+            # 客户端带有ETag时只读取ETag，数据未变化直接返回304
+            etag = redis_store.hget(redis_key, etag_field)
+            if etag and cache.is_not_modified(etag.decode('utf-8')):
+                return cache.not_modified_response(etag.decode('utf-8'))
+        resp_json, etag = redis_store.hmget(redis_key, [page_field, etag_field])
     except Exception as e:
         current_app.logger.error(e)
     else:
         if resp_json:
-            return resp_json, 200, {'Content-Type': 'application/json'}
+            return cache.json_response(resp_json, etag.decode('utf-8') if etag else cache.make_etag(resp_json))
     # 过滤条件的参数列表容器
     filter_params = []
 
     # 填充过滤参数
-    conflict_orders = None
-    try:
-        if start_date and end_date:
-            # 查询冲突的订单
-            conflict_orders = Order.query.filter(Order.begin_date <= end_date, Order.end_date >= start_date).all()
-        elif start_date:
-            conflict_orders = Order.query.filter(Order.end_date >= start_date).all()
-        elif end_date:
-            conflict_orders = Order.query.filter(Order.begin_date <= end_date).all()
-    except Exception as e:
-        current_app.logger.error(e)
-        return jsonify(errno=RET.DBERR, errmsg='数据库错误')
-    if conflict_orders is not None:
-        # 从订单中获取冲突的房屋id
-        conflict_house_ids = [order.house_id for order in conflict_orders]
-
-        if conflict_house_ids:
-            filter_params.append(House.id.notin_(conflict_house_ids))
+    # 在预订日期索引中查找日期范围内被占用的房屋，以子查询的方式排除
+    if start_date or end_date:
+        filter_params.append(House.id.notin_(availability.booked_house_query(start_date, end_date)))
     # 区域条件
     if area_id:
         filter_params.append(House.area_id == area_id)
+    # 关键词条件，在倒排索引中检索标题和地址
+    house_ids = None
+    if keyword:
+        try:
+            house_ids = house_search.search(keyword)
+        except Exception as e:
+            current_app.logger.error(e)
+            return jsonify(errno=RET.DBERR, errmsg='数据库错误')
+    # 设施条件，在位图索引中与城区、可预订日期、关键词结果求交集，得到符合条件的房屋编号
+    facets = None
+    if facility_ids:
+        try:
+            booked_house_ids = None
+            if start_date or end_date:
+                booked_house_ids = [house_id for house_id, in availability.booked_house_query(start_date, end_date)]
+            house_ids, facets = facility_index.search(facility_ids, area_id, booked_house_ids, house_ids)
+        except Exception as e:
+            current_app.logger.error(e)
+            return jsonify(errno=RET.DBERR, errmsg='数据库错误')
+    if house_ids is not None:
+        filter_params.append(House.id.in_(house_ids) if house_ids else false())
 
     # 3 查询数据库
-    # 补充排序条件
-
-    if sort_key == 'booking':  # 入住最多
-        house_query = House.query.filter(*filter_params).order_by(House.order_count.desc())
-    elif sort_key == 'price-inc':  # 价格由低到高
-        house_query = House.query.filter(*filter_params).order_by(House.price.asc())
-    elif sort_key == 'price-des':  # 价格由低到高
-        house_query = House.query.filter(*filter_params).order_by(House.price.desc())
-    else:  # 新旧
-        house_query = House.query.filter(*filter_params).order_by(House.create_time.desc())
-
-    # 处理分页
-    try:
-        page_obj = house_query.paginate(page, contants.HOUSE_LIST_PAGE_CAPACITY, error_out=False)
-    except Exception as e:
-        current_app.logger.error(e)
-        return jsonify(errno=RET.DBERR, errmsg='数据库错误')
-    # 获取页面数据
-    house_li = page_obj.items
-    houses = []
-    for house in house_li:
-        houses.append(house.to_basic_dict())
-    # 获取总页数
-    total_page = page_obj.pages
-    resp_dict = dict(
-        errno=RET.OK, errmsg='ok', data={'total_page': total_page, 'houses': houses, 'current_page': page})
-    resp_json = json.dumps(resp_dict)
-    if page <= total_page:
-        # 设置redis key
-        redis_key = 'house_%s_%s_%s_%s' % (start_date, end_date, area_id, sort_key)
+    house_query = House.query.filter(*filter_params)
+
+    if cursor is not None:
+        # 游标分页，按排序字段定位下一页，不需要统计总数
+        try:
+            house_li, next_cursor = pagination.paginate(
+                house_query, sort_columns, cursor, contants.HOUSE_LIST_PAGE_CAPACITY)
+        except Exception as e:
+            current_app.logger.error(e)
+            return jsonify(errno=RET.DBERR, errmsg='数据库错误')
+        houses = houses_to_basic_dicts(house_li)
+        resp_dict = dict(errno=RET.OK, errmsg='ok', data={'houses': houses, 'next_cursor': next_cursor})
+        cacheable = True
+    else:
+        # 处理分页
+        try:
+            page_obj = house_query.order_by(*pagination.order_by(sort_columns)).paginate(
+                page, contants.HOUSE_LIST_PAGE_CAPACITY, error_out=False)
+        except Exception as e:
+            current_app.logger.error(e)
+            return jsonify(errno=RET.DBERR, errmsg='数据库错误')
+        # 获取页面数据
+        house_li = page_obj.items
+        houses = houses_to_basic_dicts(house_li)
+        # 获取总页数
+        total_page = page_obj.pages
+        resp_dict = dict(
+            errno=RET.OK, errmsg='ok', data={'total_page': total_page, 'houses': houses, 'current_page': page})
+        cacheable = page <= total_page
+    if facets is not None:
+        # json的键只能是字符串
+        resp_dict['data']['facets'] = dict((str(facility_id), count) for facility_id, count in facets.items())
+    resp_json = serializer.dumps(resp_dict)
+    etag = cache.make_etag(resp_json)
+    if cacheable:
         try:
             # 创建redis管道对象，可以执行多个语句
             pipeline = redis_store.pipeline()
             # 开启多语句的记录
             pipeline.multi()
-            pipeline.hset(redis_key, page, resp_json)
+            pipeline.hset(redis_key, page_field, resp_json)
+            pipeline.hset(redis_key, etag_field, etag)
             pipeline.expire(redis_key, contants.HOUSE_LIST_PAGE_REDIS_CACHE_EXPIRES)
             # 执行语句
-            pipeline.excute()
+            pipeline.execute()
         except Exception as e:
             current_app.logger.error(e)
-        # return jsonify(errno=RET.OK, errmsg='ok', data={'total_page': total_page, 'houses': houses, 'current_page': page})
-    return resp_json, 200, {'Content-Type': 'application/json'}
+    return cache.json_response(resp_json, etag)
+
+
+def build_home_page_json():
+    """查询订单数目最多的房屋，转换为json字符串"""
+    # 优先从redis中维护的排行中读取
+    cards = house_listing.top_houses(contants.HOME_PAGE_MAX_HOUSES)
+    if cards is not None:
+        return '[%s]' % ','.join(cards)
+    # 排行未就绪时查询数据库，未设置主图片的房屋不参与展示
+    houses = House.query.filter(House.index_image_url != '', House.index_image_url.isnot(None)).order_by(
+        House.order_count.desc(), House.id.desc()).limit(contants.HOME_PAGE_MAX_HOUSES)
+    house_list = houses_to_basic_dicts(houses)
+    return serializer.dumps(house_list)
 
 
 @api.route("/houses/index", methods=["GET"])
 def get_house_index():
     """获取主页幻灯片展示的房屋基本信息"""
-    # 从缓存中尝试去除数据
-    try:
-        ret = redis_store.get('home_page_data')
-    except Exception as e:
-        current_app.logger.error(e)
-        ret = None
-    if ret:
-        current_app.logger.info("hit house index info redis")
-        # 因为redis中保存的是json字符串，所以直接进行字符串拼接返回
-        return '{"errno":0, "errmsg":"OK", "data":%s}' % ret, 200, {"Content-Type": "application/json"}
-        # 查询数据库，返回房屋订单数目最多的5条数据
+    # 客户端带有ETag时只读取ETag，数据未变化直接返回304
+    if request.if_none_match:
+        etag = cache.get_refresh_ahead_etag('home_page_data', build_home_page_json,
+                                            contants.HOME_PAGE_DATA_REDIS_EXPIRES)
+        if cache.is_not_modified(etag):
+            return cache.not_modified_response(etag)
+    # 从redis中获取数据，缓存临近过期时由一个请求在后台刷新，其余请求继续使用缓存
     try:
-        houses = House.query.order_by(House.order_count.desc()).limit(contants.HOME_PAGE_MAX_HOUSES)
+        houses_json, etag = cache.get_refresh_ahead('home_page_data', build_home_page_json,
+                                                    contants.HOME_PAGE_DATA_REDIS_EXPIRES)
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='数据库错误')
-    if not houses:
-        return jsonify(errno=RET.NODATA, errmsg='暂无数据')
-    # 如果房屋未设置主图片，则跳过
-    house_list = []
-    for house in houses:
-        if not house.index_image_url:
-            continue
-        house_list.append(house.to_basic_dict())
-    houses_json = json.dumps(house_list)
-    try:
-        redis_store.setex('home_page_data', contants.HOME_PAGE_DATA_REDIS_EXPIRES, houses_json)
-    except Exception as e:
-        current_app.logger.error(e)
-
-    # 将数据转换为json，并保存到redis缓存
-    return '{"errno":0,"errmsg":"OK",data:%s}' % houses_json, 200, '{"Content-Type:"application/json"}'
+    # 因为redis中保存的是json字符串，所以直接进行字符串拼接返回
+    return cache.json_response('{"errno":0, "errmsg":"OK", "data":%s}' % houses_json, etag)
@@ -1,9 +1,16 @@
+import csv
+import io
 import datetime
-from flask import request, g, jsonify, current_app
-from ihome_api import db, redis_store
+from flask import request, g, jsonify, current_app, Response, stream_with_context
+from ihome_api import db, contants
 from ihome_api.utils.commons import login_required
+from ihome_api.utils.routing import read_only
 from ihome_api.utils.response_code import RET
-from ihome_api.models import House, Order
+from ihome_api.models import House, Order, HouseMonthStat
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
+from ihome_api.utils import availability, house_listing, cache, pagination, order_stats, serializer
+from ihome_api.utils.preload import orders_to_basic_dicts
 from . import api
 
 
@@ -26,7 +33,7 @@ def save_order():
         start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d')
         end_date = datetime.datetime.strptime(end_date_str, '%Y-%m-%d')
         assert start_date <= end_date
-        days = end_date - start_date + 1
+        days = (end_date - start_date).days + 1
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='数据库错误')
@@ -41,15 +48,15 @@ def save_order():
     # 预定的房屋是否是房东自己的
     if house.user_id == user_id:
         return jsonify(errno=RET.ROLEERR, errmsg='不能预定自己的房屋')
-    # 确保用户预定的时间内 房屋没有被别人预定
+    # 确保用户预定的时间内 房屋没有被别人预定，直接在预订日期索引中查找，索引未就绪时查询订单表
+    # 这里只是提前拦截明显冲突的请求，并发时由索引表 (house_id, day) 的主键保证同一天只能被一个订单占用
     try:
-        count = Order.query.filter(
-            Order.house_id == house_id, Order.begin_date <= end_date, Order.end_date >= start_date).count()
+        booked = availability.is_house_booked(house_id, start_date, end_date)
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='数据库错误')
-    if count > 0:
-        return jsonify(errno=RET.DATAEXIST, errmgs='房屋已经被预定啦')
+    if booked:
+        return jsonify(errno=RET.DATAEXIST, errmsg='房屋已经被预定啦')
     # 订单总额
     amount = house.price * days
 
@@ -63,7 +70,16 @@ def save_order():
                   amount=amount)
     try:
         db.session.add(order)
+        # 同步写入预订日期索引，与订单在同一个事务中提交
+        availability.book_days(order)
+        # 同步更新房屋的月度统计
+        order_stats.record([order], None, 'WAIT_ACCEPT')
         db.session.commit()
+    except IntegrityError as e:
+        # 并发预订同一天时，后提交的订单违反索引表的主键约束，整个订单回滚
+        db.session.rollback()
+        current_app.logger.info(e)
+        return jsonify(errno=RET.DATAEXIST, errmsg='房屋已经被预定啦')
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(e)
@@ -71,35 +87,142 @@ def save_order():
     return jsonify(errno=RET.OK, errmsg='预定成功', data={'order_id': order.id})
 
 
+# 订单列表游标分页的排序字段，按创建时间倒序，(字段, 是否降序)
+ORDER_LIST_SORT_COLUMNS = [(Order.create_time, True), (Order.id, True)]
+
+
+# GET /api/v1.0/user/orders?role=&status=&cursor=
 @api.route('/user/orders', methods=['GET'])
 @login_required
+@read_only
 def get_user_orders():
     """获取用户订单"""
     user_id = g.user_id
 
     # 获取用户身份
     role = request.args.get('role', '')
+    # 按订单状态筛选
+    status = request.args.get('status', '')
+    if status and status not in Order.status.type.enums:
+        return jsonify(errno=RET.PARAMERR, errmsg='参数错误')
+    # 传入cursor参数时按创建时间倒序游标分页，首页传空的cursor
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            pagination.decode_cursor(cursor, ORDER_LIST_SORT_COLUMNS)
+        except ValueError as e:
+            current_app.logger.error(e)
+            return jsonify(errno=RET.PARAMERR, errmsg='分页参数错误')
     # 查询订单数据
+    next_cursor = None
     try:
         if 'landlord' == role:
-            # 以房东的身份查询
-            # 先查询属于自己的房子有哪些
-            houses = House.query.filter(House.user_id == user_id).all()
-            house_ids = [house.id for house in houses]
-            # 再查询预定自己的房子的订单
-            orders = Order.query.filter(Order.id.in_(house_ids)).order_by(Order.create_time)
+            # 以房东的身份查询，通过订单的房屋关联到房东，一次查询完成，同时取出订单对应的房屋
+            orders = Order.query.join(House, Order.house_id == House.id).filter(
+                House.user_id == user_id).options(contains_eager(Order.house))
         # 以房客的身份查询
         else:
-            orders = Order.query.filter(Order.user_id == user_id).order_by(Order.create_time)
-
+            orders = Order.query.filter(Order.user_id == user_id)
+        if status:
+            orders = orders.filter(Order.status == status)
+        if cursor is None:
+            orders = orders.order_by(Order.create_time).all()
+        else:
+            orders, next_cursor = pagination.paginate(
+                orders, ORDER_LIST_SORT_COLUMNS, cursor, contants.ORDER_LIST_PAGE_CAPACITY)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.DBERR, errmsg='查询失败')
+    # 将订单转换为字典数据，批量加载订单对应的房屋
+    try:
+        orders_dict_list = orders_to_basic_dicts(orders)
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='查询失败')
-    # 将订单转换为字典数据
-    orders_dict_list = []
-    for order in orders:
-        orders_dict_list.append(order.to_basic_dict())
-    return jsonify(errno=RET.OK, errmgs='查询成功', data={'orders': orders_dict_list})
+    data = {'orders': orders_dict_list}
+    if cursor is not None:
+        data['next_cursor'] = next_cursor
+    return serializer.jsonify(errno=RET.OK, errmgs='查询成功', data=data)
+
+
+# 导出订单的字段
+ORDER_EXPORT_FIELDS = ('order_id', 'house_id', 'title', 'start_date', 'end_date', 'ctime', 'days', 'amount',
+                       'status', 'comment')
+
+
+def _iter_export_rows(query):
+    """分批从数据库读取订单，每次只在内存中保留一批数据"""
+    for row in query.yield_per(contants.ORDER_EXPORT_BATCH_SIZE):
+        yield (row.id, row.house_id, row.title, row.begin_date.strftime('%Y-%m-%d'),
+               row.end_date.strftime('%Y-%m-%d'),
+               row.create_time.strftime('%Y-%m-%d %H:%M:%S'),
+               row.days, row.amount, row.status, row.comment or '')
+
+
+def _export_csv(rows):
+    # 带上BOM，excel打开时中文不会乱码
+    buf = io.StringIO()
+    buf.write('\ufeff')
+    writer = csv.writer(buf)
+    writer.writerow(ORDER_EXPORT_FIELDS)
+    for index, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if index % contants.ORDER_EXPORT_BATCH_SIZE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _export_ndjson(rows):
+    lines = []
+    for row in rows:
+        lines.append(serializer.dumps(dict(zip(ORDER_EXPORT_FIELDS, row))))
+        if len(lines) == contants.ORDER_EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+# 导出格式对应的 (生成函数, mimetype, 文件扩展名)
+ORDER_EXPORT_FORMATS = {
+    'csv': (_export_csv, 'text/csv', 'csv'),
+    'ndjson': (_export_ndjson, 'application/x-ndjson', 'jsonl'),
+}
+
+
+# GET /api/v1.0/user/orders/export?role=&status=&format=csv|ndjson
+@api.route('/user/orders/export', methods=['GET'])
+@login_required
+def export_user_orders():
+    """流式导出用户的全部订单，边查询边返回，内存占用与订单数量无关"""
+    user_id = g.user_id
+    role = request.args.get('role', '')
+    status = request.args.get('status', '')
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ORDER_EXPORT_FORMATS or (status and status not in Order.status.type.enums):
+        return jsonify(errno=RET.PARAMERR, errmsg='参数错误')
+    # 只查询需要的字段，不创建模型对象
+    query = db.session.query(Order.id, Order.house_id, House.title, Order.begin_date, Order.end_date,
+                             Order.create_time, Order.days, Order.amount, Order.status,
+                             Order.comment).join(House, Order.house_id == House.id)
+    if 'landlord' == role:
+        query = query.filter(House.user_id == user_id)
+    else:
+        query = query.filter(Order.user_id == user_id)
+    if status:
+        query = query.filter(Order.status == status)
+    query = query.order_by(Order.create_time, Order.id)
+
+    generate, mimetype, extension = ORDER_EXPORT_FORMATS[export_format]
+    headers = {'Content-Disposition': 'attachment; filename=orders.%s' % extension}
+    return Response(stream_with_context(generate(_iter_export_rows(query))),
+                    mimetype=mimetype, headers=headers)
+
+
+# 房东处理订单的行为对应的订单状态
+ORDER_ACTION_STATUS = {'accept': 'WAIT_PAYMENT', 'reject': 'REJECTED'}
 
 
 @api.route('/orders/<int:order_id>/status', methods=['PUT'])
@@ -108,11 +231,11 @@ def accept_reject_order(order_id):
     """接单、拒单"""
     user_id = g.user_id
     req_data = request.get_json()
-    if not req_data:
+    if not req_data or not isinstance(req_data, dict):
         return jsonify(errno=RET.PARAMERR, errmsg='参数错误')
     # action参数表明客户端请求的是接单还是拒单的行为
     action = req_data.get('action')
-    if action not in ['accept,reject']:
+    if not isinstance(action, str) or action not in ORDER_ACTION_STATUS:
         return jsonify(errno=RET.PARAMERR, errmsg='参数错误')
     # 根据订单号查询订单，并且要求订单处于等待接单状态
     try:
@@ -130,12 +253,16 @@ def accept_reject_order(order_id):
     # 拒单，要求用户传递拒单原因
     elif action == 'reject':
         reason = req_data.get('reason')
-        if not reason:
+        if not reason or not isinstance(reason, str):
             return jsonify(errno=RET.PARAMERR, errmsg='请输入理由')
         order.status = 'REJECTED'
         order.comment = reason
     try:
         db.session.add(order)
+        if order.status == 'REJECTED':
+            # 拒单后释放订单占用的日期
+            availability.release_days([order.id])
+        order_stats.record([order], 'WAIT_ACCEPT', order.status)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -144,6 +271,109 @@ def accept_reject_order(order_id):
     return jsonify(errno=RET.OK, errmsg='OK')
 
 
+def _bulk_order_actions(req_data):
+    """将批量接单、拒单的参数统一为 [(订单编号, 行为, 拒单原因)]
+
+    支持两种格式：
+    {"order_ids": [1, 2], "action": "reject", "reason": "..."}
+    {"orders": [{"order_id": 1, "action": "accept"}, {"order_id": 2, "action": "reject", "reason": "..."}]}
+    """
+    if 'orders' in req_data:
+        items = req_data.get('orders')
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return None
+        items = [(item.get('order_id'), item.get('action'), item.get('reason')) for item in items]
+    else:
+        order_ids = req_data.get('order_ids')
+        if not isinstance(order_ids, list):
+            return None
+        items = [(order_id, req_data.get('action'), req_data.get('reason')) for order_id in order_ids]
+    actions = []
+    for order_id, action, reason in items:
+        try:
+            order_id = int(order_id)
+        except (TypeError, ValueError):
+            return None
+        # 行为和拒单原因只能是字符串，缺少时在逐个订单检查时返回错误
+        if action is not None and not isinstance(action, str):
+            return None
+        if reason is not None and not isinstance(reason, str):
+            return None
+        actions.append((order_id, action, reason))
+    return actions
+
+
+# PUT /api/v1.0/orders/status
+@api.route('/orders/status', methods=['PUT'])
+@login_required
+def bulk_accept_reject_orders():
+    """批量接单、拒单，在一个事务中完成，返回每个订单的处理结果"""
+    user_id = g.user_id
+    req_data = request.get_json()
+    if not req_data or not isinstance(req_data, dict):
+        return jsonify(errno=RET.PARAMERR, errmsg='参数错误')
+    actions = _bulk_order_actions(req_data)
+    if not actions or len(actions) > contants.ORDER_BULK_ACTION_MAX:
+        return jsonify(errno=RET.PARAMERR, errmsg='参数错误')
+
+    # 先检查每个订单的参数，记录不能处理的原因
+    results = {}
+    for order_id, action, reason in actions:
+        if order_id in results:
+            results[order_id] = (RET.PARAMERR, '订单重复')
+        elif action not in ORDER_ACTION_STATUS:
+            results[order_id] = (RET.PARAMERR, '参数错误')
+        elif action == 'reject' and not reason:
+            results[order_id] = (RET.PARAMERR, '请输入理由')
+        else:
+            results[order_id] = None
+    order_ids = [order_id for order_id, result in results.items() if result is None]
+
+    try:
+        # 一次查询出属于当前房东并且处于等待接单状态的订单，锁住这些订单直到事务结束
+        valid_orders = dict((order.id, order) for order in db.session.query(
+            Order.id, Order.house_id, Order.begin_date, Order.end_date, Order.house_price).join(
+            House, Order.house_id == House.id).filter(
+            Order.id.in_(order_ids), Order.status == 'WAIT_ACCEPT', House.user_id == user_id
+        ).with_for_update().all()) if order_ids else {}
+        # 接单的订单一次更新，拒单的订单按拒单原因分组更新
+        accept_ids = []
+        reject_ids = {}
+        for order_id, action, reason in actions:
+            if order_id not in valid_orders or results[order_id] is not None:
+                continue
+            if action == 'accept':
+                accept_ids.append(order_id)
+            else:
+                reject_ids.setdefault(reason, []).append(order_id)
+            results[order_id] = (RET.OK, 'OK')
+        if accept_ids:
+            Order.query.filter(Order.id.in_(accept_ids), Order.status == 'WAIT_ACCEPT').update(
+                {Order.status: ORDER_ACTION_STATUS['accept']}, synchronize_session=False)
+        for reason, ids in reject_ids.items():
+            Order.query.filter(Order.id.in_(ids), Order.status == 'WAIT_ACCEPT').update(
+                {Order.status: ORDER_ACTION_STATUS['reject'], Order.comment: reason}, synchronize_session=False)
+        # 拒单后释放订单占用的日期
+        reject_id_list = [order_id for ids in reject_ids.values() for order_id in ids]
+        availability.release_days(reject_id_list)
+        # 同步更新房屋的月度统计
+        order_stats.record([valid_orders[order_id] for order_id in accept_ids],
+                           'WAIT_ACCEPT', ORDER_ACTION_STATUS['accept'])
+        order_stats.record([valid_orders[order_id] for order_id in reject_id_list],
+                           'WAIT_ACCEPT', ORDER_ACTION_STATUS['reject'])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(e)
+        return jsonify(errno=RET.DBERR, errmsg='数据库错误')
+
+    result_list = []
+    for order_id in results:
+        errno, errmsg = results[order_id] or (RET.REQERR, '操作无效')
+        result_list.append({'order_id': order_id, 'errno': errno, 'errmsg': errmsg})
+    return jsonify(errno=RET.OK, errmsg='OK', data={'results': result_list})
+
+
 @api.route("/orders/<int:order_id>/comment", methods=["PUT"])
 @login_required
 def save_order_comment(order_id):
@@ -176,6 +406,7 @@ def save_order_comment(order_id):
     try:
         db.session.add(order)
         db.session.add(house)
+        order_stats.record([order], 'WAIT_COMMENT', 'COMPLETE')
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -183,7 +414,75 @@ def save_order_comment(order_id):
         return jsonify(errno=RET.DBERR, errmsg='数据库错误')
     # 因为房屋详情中有订单的评价信息，为了让最新的评价信息展示在房屋详情中，所以删除redis中关于本订单房屋的详情缓存
     try:
-        redis_store.delete('house_info_%s' % order.house.id)
+        cache.invalidate('house_info_%s' % order.house.id)
+    except Exception as e:
+        current_app.logger.error(e)
+    # 订单数变化后更新列表中的排序、房屋数据和首页排行
+    try:
+        house_listing.index_house(house)
+        cache.expire_refresh_ahead('home_page_data')
     except Exception as e:
         current_app.logger.error(e)
     return jsonify(errno=RET.OK, errmsg='OK')
+
+
+def _parse_month(month_str):
+    """解析 YYYY-MM 格式的月份，返回当月第一天"""
+    return datetime.datetime.strptime(month_str, '%Y-%m').date()
+
+
+# GET /api/v1.0/user/orders/stats?house_id=&start=YYYY-MM&end=YYYY-MM
+@api.route('/user/orders/stats', methods=['GET'])
+@login_required
+def get_order_stats():
+    """房东的订单月度统计，只读取汇总表"""
+    user_id = g.user_id
+    house_id = request.args.get('house_id', '')
+    start = request.args.get('start', '')
+    end = request.args.get('end', '')
+    try:
+        house_id = int(house_id) if house_id else None
+        start = _parse_month(start) if start else None
+        end = _parse_month(end) if end else None
+        if start and end:
+            assert start <= end
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.PARAMERR, errmsg='参数错误')
+
+    try:
+        house_query = db.session.query(House.id).filter(House.user_id == user_id)
+        if house_id:
+            house_query = house_query.filter(House.id == house_id)
+        house_count = house_query.count()
+        stats = HouseMonthStat.query.join(House, HouseMonthStat.house_id == House.id).filter(
+            House.user_id == user_id)
+        if house_id:
+            stats = stats.filter(HouseMonthStat.house_id == house_id)
+        if start:
+            stats = stats.filter(HouseMonthStat.month >= start)
+        if end:
+            stats = stats.filter(HouseMonthStat.month <= end)
+        stats = stats.order_by(HouseMonthStat.month, HouseMonthStat.house_id).all()
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.DBERR, errmsg='数据库错误')
+    if house_id and not house_count:
+        return jsonify(errno=RET.NODATA, errmsg='房屋不存在')
+
+    # 按月份合计所有房屋，入住率 = 占用天数 / (房屋数 * 当月天数)
+    houses = []
+    months = {}
+    for stat in stats:
+        stat_dict = stat.to_dict()
+        stat_dict['occupancy'] = round(stat.booked_days / float(order_stats.days_in_month(stat.month)), 4)
+        houses.append(stat_dict)
+        total = months.get(stat.month)
+        if total is None:
+            total = months[stat.month] = dict(month=stat_dict['month'], bookings=0, accepted=0, completed=0,
+                                              booked_days=0, revenue=0)
+        for field in ('bookings', 'accepted', 'completed', 'booked_days', 'revenue'):
+            total[field] += stat_dict[field]
+    for month, total in months.items():
+        total['occupancy'] = round(total['booked_days'] / float(house_count * order_stats.days_in_month(month)), 4)
+    return jsonify(errno=RET.OK, errmsg='OK', data={'months': list(months.values()), 'houses': houses})
@@ -6,6 +6,8 @@ from ihome_api import redis_store, db
 from ihome_api.models import User
 from sqlalchemy.exc import IntegrityError
 from ihome_api import contants
+from ihome_api.utils import sessions, password as passwords
+from ihome_api.utils.rate_limit import rate_limit, by_ip, consume
 import re
 
 
@@ -59,8 +61,12 @@ def register():
     #     if user is not None:
     #         return jsonify(errno=RET.DATAERR, errmsg='手机号已经被注册')
     # # 保存用户的注册数据到数据库中
-    user = User(name=mobile, mobile=mobile)
-    user.password = password
+    # 密码哈希在线程池中计算，不占用请求线程的CPU
+    try:
+        password_hash = passwords.hash_password(password)
+    except passwords.PasswordHashBusy:
+        return jsonify(errno=RET.SERVERERR, errmsg='服务器繁忙，请稍后重试')
+    user = User(name=mobile, mobile=mobile, password_hash=password_hash)
     try:
         db.session.add(user)
         db.session.commit()
@@ -82,6 +88,7 @@ def register():
 
 
 @api.route('/sessions', methods=['POST'])
+@rate_limit('login_ip', by_ip, contants.LOGIN_IP_LIMIT, contants.LOGIN_IP_PERIOD)
 def login():
     """登录
     @:param 手机号、密码
@@ -100,29 +107,35 @@ def login():
     if not re.match(r'1[34578]\d{9}', mobile):
         return jsonify(errno=RET.PARAMERR, errmsg='手机格式错误')
     # 判断错误次数，如果超过限制则限制登录
-    # redis记录： "access_count_ip":次数
+    # 每个IP的密码错误次数是一个令牌桶，这里只检查不消耗，密码错误时才消耗
     user_ip = request.remote_addr
-    try:
-        access_nums = redis_store.get('access_count_%s' % user_ip)
-    except Exception as e:
-        current_app.logger.error(e)
-    else:
-        if access_nums is not None and int(access_nums) >= contants.LOGIN_ERROR_MAX_TIMES:
-            return jsonify(errno=RET.REQERR, errmsg="密码错误次数过多，请稍后重试")
+    allowed, _ = consume('login_error_ip', user_ip, contants.LOGIN_ERROR_MAX_TIMES,
+                         contants.LOGIN_ERROR_FORBID_TIME, cost=0)
+    if not allowed:
+        return jsonify(errno=RET.REQERR, errmsg="密码错误次数过多，请稍后重试")
     # 查询用户数据库密码
     try:
         user = User.query.filter_by(mobile=mobile).first()
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='获取用户信息失败')
-    if user is None or not user.check_password(password):
+    try:
+        verified = user is not None and passwords.verify_password(user.password_hash, password)
+    except passwords.PasswordHashBusy:
+        return jsonify(errno=RET.SERVERERR, errmsg='服务器繁忙，请稍后重试')
+    if not verified:
         # 失败，记录错误次数，返回信息
+        consume('login_error_ip', user_ip, contants.LOGIN_ERROR_MAX_TIMES, contants.LOGIN_ERROR_FORBID_TIME)
+        return jsonify(errno=RET.PARAMERR, errmsg='用户名或密码错误')
+    # 哈希算法或迭代次数已调整时，用本次登录的明文密码重新计算，失败不影响登录
+    if passwords.needs_rehash(user.password_hash):
         try:
-            redis_store.incr("access_num_%s" % user_ip)
-            redis_store.expire("access_num_%s" % user_ip, contants.LOGIN_ERROR_FORBID_TIME)
+            User.query.filter_by(id=user.id).update(
+                {User.password_hash: passwords.hash_password(password)}, synchronize_session=False)
+            db.session.commit()
         except Exception as e:
+            db.session.rollback()
             current_app.logger.error(e)
-        return jsonify(errno=RET.PARAMERR, errmsg='用户名或密码错误')
     # 成功，保存登录状态在session中
     session['name'] = user.name
     session['mobile'] = user.mobile
@@ -143,5 +156,11 @@ def check_login():
 @api.route('/sessions', methods=['DELETE'])
 def logout():
     """退出登录"""
+    # 签名cookie会话需要加入吊销列表，否则cookie在有效期内仍然可用
+    try:
+        sessions.revoke(session)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(errno=RET.DBERR, errmsg='退出失败')
     session.clear()
     return jsonify(errno=RET.OK, errmsg='OK')
@@ -1,10 +1,11 @@
 # coding:utf-8
 from . import api
-from ihome_api.utils.commons import login_required
+from ihome_api.utils.commons import login_required, current_user
 from flask import g, current_app, jsonify, request, session
 from ihome_api.utils.response_code import RET
 from ihome_api.utils.image_storage import storage
-from ihome_api.models import User
+from ihome_api.models import User, House
+from ihome_api.utils import house_listing, cache, user_cache
 from ihome_api import db, redis_store
 from ihome_api import contants
 from sqlalchemy.exc import IntegrityError
@@ -60,14 +61,20 @@ def set_user_avatar():
     # 把路径存储到用户表中
     avatar_url = contants.USER_PATH + image_file.filename
     try:
-        user = User.query.filter_by(id=user_id).first()
-        user.avatar_url = avatar_url
-        db.session.add(user)
+        User.query.filter_by(id=user_id).update({User.avatar_url: avatar_url}, synchronize_session=False)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='数据库错误')
+    # 列表中的房屋数据和房屋详情包含房东头像，需要一并更新
+    try:
+        user_cache.invalidate_profile(user_id)
+        houses = House.query.filter(House.user_id == user_id).all()
+        house_listing.index_houses(houses)
+        cache.invalidate(*['house_info_%s' % house.id for house in houses])
+    except Exception as e:
+        current_app.logger.error(e)
     return jsonify(errno=RET.OK, errmsg='保存成功', data={'avatar_url': contants.USER_PATH + image_file.filename})
 
 
@@ -82,16 +89,9 @@ def set_user_name():
     user_name = req_dict.get('name')
     if not all((user_name,)):
         return jsonify(errno=RET.PARAMERR, errmsg='用户名称不能为空')
+    # 直接更新，不需要先查询用户
     try:
-        user = User.query.filter_by(id=user_id).first()
-    except Exception as e:
-        current_app.logger.error(e)
-        return jsonify(errno=RET.DBERR, errmsg='获取用户信息失败')
-    if user is None:
-        return jsonify(errno=RET.USERERR, errmsg='用户不存在，请退出重试')
-    user.name = user_name
-    try:
-        db.session.add(user)
+        updated = User.query.filter_by(id=user_id).update({User.name: user_name}, synchronize_session=False)
         db.session.commit()
     except IntegrityError as e:
         db.session.rollback()
@@ -101,8 +101,17 @@ def set_user_name():
         db.session.rollback()
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='数据库错误')
+    if not updated:
+        return jsonify(errno=RET.USERERR, errmsg='用户不存在，请退出重试')
     redis_store.setex('user_name_%s' % user_id, time=contants.USER_NAME_REDIS_EXPIRES, value=user_name)
     session['name'] = user_name
+    # 房屋详情中包含房东名字，删除用户资料缓存和各进程中的房屋详情缓存
+    try:
+        user_cache.invalidate_profile(user_id)
+        house_ids = [house_id for house_id, in db.session.query(House.id).filter(House.user_id == user_id)]
+        cache.invalidate(*['house_info_%s' % house_id for house_id in house_ids])
+    except Exception as e:
+        current_app.logger.error(e)
     return jsonify(errno=RET.OK, errmsg='保存成功')
 
 
@@ -112,28 +121,28 @@ def get_user():
     """获取用户信息
     @:param 用户ID
     """
-    use_id = g.user_id
     try:
-        user = User.query.filter_by(id=use_id).first()
+        user = current_user()
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='数据库错误')
     if user is None:
         return jsonify(errno=RET.USERERR, errmsg='用户不存在')
-    return jsonify(errno=RET.OK, errmsg='查询成功', data=user.to_dict())
+    return jsonify(errno=RET.OK, errmsg='查询成功', data=user_cache.basic_dict(user))
 
 
 @api.route('/user/auth', methods=['GET'])
 @login_required
 def get_user_auth():
     """查询用户实名信息"""
-    user_id = g.user_id
     try:
-        user = User.query.filter_by(id=user_id).first()
+        user = current_user()
     except Exception as e:
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='数据库查询异常')
-    return jsonify(errno=RET.OK, errmsg='查询用户实名信息成功', data=user.auth_to_dict())
+    if user is None:
+        return jsonify(errno=RET.USERERR, errmsg='用户不存在')
+    return jsonify(errno=RET.OK, errmsg='查询用户实名信息成功', data=user_cache.auth_dict(user))
 
 
 @api.route('user/auth', methods=['POST'])
@@ -144,21 +153,20 @@ def set_user_auth():
     resp_dict = request.get_json()
     real_name = resp_dict.get('real_name')
     id_cast = resp_dict.get('id_card')
+    # 直接更新，不需要先查询用户
     try:
-        user = User.query.filter_by(id=user_id).first()
-    except Exception as e:
-        current_app.logger.error(e)
-        return jsonify(errno=RET.DBERR, errmsg='数据库查询异常')
-    if user is None:
-        return jsonify(errno=RET.USERERR, errmsg='用户不存在')
-    user.id_card = id_cast
-    user.real_name = real_name
-    try:
-        db.session.add(user)
         # User.query.filter_by(id=user_id, real_name=None, id_card=None).update({"real_name": real_name, "id_card": id_card})
+        updated = User.query.filter_by(id=user_id).update(
+            {User.id_card: id_cast, User.real_name: real_name}, synchronize_session=False)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(e)
         return jsonify(errno=RET.DBERR, errmsg='数据库异常')
+    if not updated:
+        return jsonify(errno=RET.USERERR, errmsg='用户不存在')
+    try:
+        user_cache.invalidate_profile(user_id)
+    except Exception as e:
+        current_app.logger.error(e)
     return jsonify(errno=RET.OK, errmsg='实名认证成功')
@@ -9,10 +9,12 @@ from ihome_api.models import User
 import random
 from ihome_api.libs.yuntongxun.sms import CCP
 from ihome_api.tasks.sms import tasks
+from ihome_api.utils.rate_limit import rate_limit, by_ip, consume, refund
 
 
 # GET 127.0.0.1/api/v1.0/image_codes/<image_code_id>
 @api.route('/image_codes/<image_code_id>')
+@rate_limit('image_codes_ip', by_ip, contants.IMAGE_CODE_IP_LIMIT, contants.IMAGE_CODE_IP_PERIOD)
 def get_image_code(image_code_id):
     """获取图片验证码
     :param image_code_id:图片验证码编号
@@ -48,6 +50,7 @@ def get_image_code(image_code_id):
 
 # GET /api/v1.0/sms_codes/<mobile>?image_code = xxx&image_code_id=xxx
 @api.route("/sms_codes/<re(r'1[34578]\d{9}'):mobile>")
+@rate_limit('sms_codes_ip', by_ip, contants.SMS_CODE_IP_LIMIT, contants.SMS_CODE_IP_PERIOD)
 def get_sms_code(mobile):
     """获取短信验证码"""
     # 获取参数
@@ -75,14 +78,6 @@ def get_sms_code(mobile):
         redis_store.delete('image_code_%s' % image_code_id)
     except Exception as e:
         current_app.logger.error(e)
-    # 判断对于这个手机号的操作，在60秒内有没有之前的记录，如果有，则认为用户操作频繁，不处理
-    try:
-        send_flag = redis_store.get('send_sms_code_%s' % mobile)
-    except Exception as e:
-        current_app.logger.error(e)
-    else:
-        if send_flag is not None:
-            return jsonify(errno=RET.REQERR, errmsg='请求过于频繁')
     # 3. 校验手机号是否存在
     try:
         user = User.query.filter_by(mobile=mobile).first()
@@ -92,18 +87,21 @@ def get_sms_code(mobile):
     else:
         if user is not None:
             return jsonify(errno=RET.DATAEXIST, errmsg='手机号已经被注册')
+    # 同一个手机号60秒内只发送一次，图片验证码校验通过后才计数，避免他人恶意占用别人的手机号；
+    # 先取令牌再发送，并发的请求只有一个能发送，没有发送出去时退还
+    allowed, _ = consume('sms_codes_mobile', mobile, 1, contants.SEND_SMS_CODE_INTERVAL)
+    if not allowed:
+        return jsonify(errno=RET.REQERR, errmsg='请求过于频繁')
     # 4. 生成短信验证码
     sms_code = "%06d" % random.randint(100000, 999999)
     # 5. 保存真实验证码
     try:
         redis_store.setex('sms_code_%s' % mobile, contants.SMS_CODE_REDIS_EXPIRES, sms_code)
-        # 保存发送给这个手机号的记录，防止用户在60秒内再次触发发送短信操作
-        redis_store.setex('send_sms_code_%s' % mobile, contants.SEND_SMS_CODE_INTERVAL, 1)
     except Exception as e:
         current_app.logger.error(e)
+        refund('sms_codes_mobile', mobile, 1, contants.SEND_SMS_CODE_INTERVAL)
         return jsonify(errno=RET.DBERR, errmsg='保存短信验证码异常')
     # 6. 发送
-    result = tasks.send_template_sms.delay(mobile, [sms_code, int(contants.SMS_CODE_REDIS_EXPIRES / 60)], 1)
     # ccp = CCP()
     # try:
     #     result = ccp.send_template_sms(mobile, [sms_code, int(contants.SMS_CODE_REDIS_EXPIRES / 60)], 1)
@@ -117,6 +115,15 @@ def get_sms_code(mobile):
     #     return jsonify(errno=RET.THIRDERR, errmsg='发送失败')
     # get 方法默认是阻塞行为，会等到有结果才返回
     # get 方法可以设置参数timeout，超时时间，如果超时则返回
-    ret = result.get()
+    try:
+        result = tasks.send_template_sms.delay(mobile, [sms_code, int(contants.SMS_CODE_REDIS_EXPIRES / 60)], 1)
+        ret = result.get()
+    except Exception as e:
+        current_app.logger.error(e)
+        refund('sms_codes_mobile', mobile, 1, contants.SEND_SMS_CODE_INTERVAL)
+        return jsonify(errno=RET.THIRDERR, errmsg='发送异常')
     current_app.logger.info(ret)
+    if ret != 0:
+        # 短信没有发出去，不占用该手机号的发送次数
+        refund('sms_codes_mobile', mobile, 1, contants.SEND_SMS_CODE_INTERVAL)
     return jsonify(errno=RET.OK, errmsg="发送成功")
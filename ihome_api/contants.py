@@ -30,3 +30,46 @@ HOME_PAGE_MAX_HOUSES = 5
 HOME_PAGE_DATA_REDIS_EXPIRES = 7200
 
 HOUSE_DETAIL_REDIS_EXPIRE_SECOND = 7200
+# 缓存后台刷新锁的有效期，单位秒
+CACHE_REFRESH_LOCK_EXPIRES = 30
+# 进程内房屋详情缓存的容量
+HOUSE_DETAIL_LOCAL_CACHE_SIZE = 1000
+# 进程内房屋详情缓存的有效期，单位秒
+HOUSE_DETAIL_LOCAL_CACHE_EXPIRES = 60
+# 负缓存（不存在的房屋、城区）的有效期，单位秒
+NEGATIVE_CACHE_EXPIRES = 60
+# 进程内城区编号校验结果的缓存容量
+AREA_LOCAL_CACHE_SIZE = 1000
+# 缓存统计数据合并到redis的间隔，单位秒
+CACHE_STATS_FLUSH_INTERVAL = 10
+# 订单列表游标分页每页数据容量
+ORDER_LIST_PAGE_CAPACITY = 20
+# 订单等待房东接单的期限，超时自动取消，单位秒
+ORDER_ACCEPT_EXPIRES = 86400
+# 接单后等待房客支付的期限，超时自动取消，单位秒
+ORDER_PAYMENT_EXPIRES = 7200
+# 定时检查超时订单的间隔，单位秒
+ORDER_EXPIRE_INTERVAL = 60
+# 每批取消的超时订单数量
+ORDER_EXPIRE_BATCH_SIZE = 500
+# 批量接单、拒单每次最多处理的订单数量
+ORDER_BULK_ACTION_MAX = 200
+# 导出订单时每批从数据库读取和输出的订单数量
+ORDER_EXPORT_BATCH_SIZE = 500
+# 用户写入数据后继续使用主库读取的时间，覆盖只读副本的同步延迟，单位秒
+DB_PRIMARY_STICKY_SECONDS = 5
+# 各进程记录redis连接池使用情况的间隔，单位秒
+REDIS_POOL_STATS_INTERVAL = 10
+# 连接池使用情况的保存时间，单位秒
+REDIS_POOL_STATS_EXPIRES = 300
+# 用户资料的redis缓存时间，单位秒
+USER_PROFILE_REDIS_EXPIRES = 3600
+# 每个IP在时间窗口内获取图片验证码的次数，时间窗口单位秒
+IMAGE_CODE_IP_LIMIT = 30
+IMAGE_CODE_IP_PERIOD = 60
+# 每个IP在时间窗口内获取短信验证码的次数，时间窗口单位秒
+SMS_CODE_IP_LIMIT = 10
+SMS_CODE_IP_PERIOD = 3600
+# 每个IP在时间窗口内的登录请求次数，时间窗口单位秒
+LOGIN_IP_LIMIT = 30
+LOGIN_IP_PERIOD = 60
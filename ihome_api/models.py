@@ -8,8 +8,8 @@ from ihome_api import contants
 
 class BaseModel(object):
     """模型基类，为每个模型补充创建时间与更新时间"""
-    create_time = db.Column(db.DateTime, default=datetime.datetime.now())
-    update_time = db.Column(db.DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
+    create_time = db.Column(db.DateTime, default=datetime.datetime.now)
+    update_time = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
 
 
 class User(BaseModel, db.Model):
@@ -109,6 +109,13 @@ class House(BaseModel, db.Model):
     images = db.relationship("HouseImage")  # 房屋的图片
     orders = db.relationship("Order", backref="house")  # 房屋的订单
 
+    # 房屋列表按城区筛选并按价格、订单数、发布时间排序时使用
+    __table_args__ = (
+        db.Index("ix_house_area_price", "area_id", "price"),
+        db.Index("ix_house_area_order_count", "area_id", "order_count"),
+        db.Index("ix_house_area_create_time", "area_id", "create_time"),
+    )
+
     def to_basic_dict(self):
         house_dict = {
             'house_id': self.id,
@@ -191,6 +198,13 @@ class Order(BaseModel, db.Model):
         default="WAIT_ACCEPT", index=True)
     comment = db.Column(db.Text)  # 订单的评论信息或者拒单原因
 
+    __table_args__ = (
+        # 房东按房屋查询订单并按创建时间排序时使用
+        db.Index("ix_order_house_create_time", "house_id", "create_time"),
+        # 按房屋和日期范围查找冲突订单时使用
+        db.Index("ix_order_house_dates", "house_id", "begin_date", "end_date"),
+    )
+
     def to_basic_dict(self):
         order_dict = {
             'order_id': self.id,
@@ -205,3 +219,43 @@ class Order(BaseModel, db.Model):
             "comment": self.comment if self.comment else ""
         }
         return order_dict
+
+
+class HouseBookedDay(db.Model):
+    """房屋预订日期索引，每个房屋被占用的每一天对应一条记录"""
+
+    __tablename__ = "ih_house_booked_day"
+
+    house_id = db.Column(db.Integer, db.ForeignKey("ih_house_info.id"), primary_key=True)  # 房屋编号
+    day = db.Column(db.Date, primary_key=True)  # 被占用的日期
+    order_id = db.Column(db.Integer, db.ForeignKey("ih_order_info.id"), nullable=False, index=True)  # 占用该日期的订单编号
+    order = db.relationship("Order")  # 占用该日期的订单
+
+    # 按日期范围查找被占用房屋时使用
+    __table_args__ = (db.Index("ix_house_booked_day_day_house", "day", "house_id"),)
+
+
+class HouseMonthStat(db.Model):
+    """房屋按月汇总的订单统计，订单状态变化时增量更新，房东统计数据只读取该表"""
+
+    __tablename__ = "ih_house_month_stat"
+
+    house_id = db.Column(db.Integer, db.ForeignKey("ih_house_info.id"), primary_key=True)  # 房屋编号
+    month = db.Column(db.Date, primary_key=True)  # 月份，保存为当月的第一天
+    booking_count = db.Column(db.Integer, nullable=False, default=0)  # 入住日期在当月的订单数
+    accept_count = db.Column(db.Integer, nullable=False, default=0)  # 其中已被接单的订单数
+    complete_count = db.Column(db.Integer, nullable=False, default=0)  # 其中已完成的订单数
+    booked_days = db.Column(db.Integer, nullable=False, default=0)  # 已接单订单在当月占用的天数
+    revenue = db.Column(db.Integer, nullable=False, default=0)  # 已接单订单在当月的金额
+
+    def to_dict(self):
+        """将统计数据转换为字典"""
+        return {
+            "house_id": self.house_id,
+            "month": self.month.strftime("%Y-%m"),
+            "bookings": self.booking_count,
+            "accepted": self.accept_count,
+            "completed": self.complete_count,
+            "booked_days": self.booked_days,
+            "revenue": self.revenue,
+        }
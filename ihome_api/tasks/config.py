@@ -1,3 +1,28 @@
 # coding:utf-8
-BROKE_URL = 'redis://127.0.0.1:6379/3'
-CELERY_RESULT_BACKEND = 'redis://127.0.0.1:6379/4'
+from config import Config
+from ihome_api import contants
+
+BROKER_URL = 'redis://%s:%s/3' % (Config.REDIS_HOST, Config.REDIS_PORT)
+CELERY_RESULT_BACKEND = 'redis://%s:%s/4' % (Config.REDIS_HOST, Config.REDIS_PORT)
+
+# 与flask使用相同的redis连接池配置
+BROKER_TRANSPORT_OPTIONS = {
+    'max_connections': Config.REDIS_MAX_CONNECTIONS,
+    'socket_timeout': Config.REDIS_SOCKET_TIMEOUT,
+    'socket_connect_timeout': Config.REDIS_SOCKET_CONNECT_TIMEOUT,
+    'health_check_interval': Config.REDIS_HEALTH_CHECK_INTERVAL,
+}
+CELERY_REDIS_MAX_CONNECTIONS = Config.REDIS_MAX_CONNECTIONS
+CELERY_REDIS_SOCKET_TIMEOUT = Config.REDIS_SOCKET_TIMEOUT
+CELERY_REDIS_SOCKET_CONNECT_TIMEOUT = Config.REDIS_SOCKET_CONNECT_TIMEOUT
+
+# 需要数据库的任务使用的flask配置模式
+FLASK_CONFIG_NAME = 'develop'
+
+# 定时任务，启动方式：celery -A ihome_api.tasks.main beat
+CELERYBEAT_SCHEDULE = {
+    'expire-orders': {
+        'task': 'ihome_api.tasks.orders.tasks.expire_orders',
+        'schedule': contants.ORDER_EXPIRE_INTERVAL,
+    },
+}
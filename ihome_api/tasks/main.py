@@ -5,4 +5,4 @@ from ihome_api.tasks import config
 celery_app = Celery('ihome')
 celery_app.config_from_object(config)
 # celery自动寻找任务
-celery_app.autodiscover_tasks(['ihome_api.tasks.sms'])
+celery_app.autodiscover_tasks(['ihome_api.tasks.sms', 'ihome_api.tasks.orders'])
@@ -0,0 +1,22 @@
+# coding:utf-8
+from ihome_api.tasks import config
+from ihome_api.tasks.main import celery_app
+
+_app = None
+
+
+def get_app():
+    """任务进程中第一次执行需要数据库的任务时创建flask应用，之后复用"""
+    global _app
+    if _app is None:
+        from ihome_api import create_app
+        _app = create_app(config.FLASK_CONFIG_NAME)
+    return _app
+
+
+@celery_app.task
+def expire_orders():
+    """取消超过接单或支付期限的订单，由 celery beat 定时调用"""
+    with get_app().app_context():
+        from ihome_api.utils import order_expiry
+        return order_expiry.expire_orders()
@@ -0,0 +1,118 @@
+# coding:utf-8
+"""房屋可预订日期索引
+
+每个被订单占用的 (房屋, 日期) 在 ih_house_booked_day 表中保存一条记录，
+按日期筛选房源时只需在该索引上按日期范围查找被占用的房屋，不再扫描订单表。
+
+索引表新建时是空的，历史订单需要运行 rebuild_booking_index 写入，完成后在redis中设置 READY_KEY，
+没有该标记时仍按订单表判断日期冲突，避免历史订单的日期被重复预订。
+"""
+import datetime
+from flask import current_app
+from ihome_api import db, redis_store
+from ihome_api.models import HouseBookedDay, Order
+
+# 会占用房屋日期的订单状态，拒单和取消的订单会释放日期
+BOOKING_STATUS = ("WAIT_ACCEPT", "WAIT_PAYMENT", "PAID", "WAIT_COMMENT", "COMPLETE")
+# 索引重建完成的标记
+READY_KEY = 'house_booked_day_ready'
+
+
+def to_date(value):
+    """将 datetime 转换为 date，索引中只保存日期"""
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def iter_days(begin_date, end_date):
+    """依次返回 begin_date 到 end_date（包含）之间的每一天"""
+    day = to_date(begin_date)
+    end = to_date(end_date)
+    while day <= end:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+def date_range_filter(start_date=None, end_date=None):
+    """构造按日期范围筛选索引记录的条件，起止日期都可以为空"""
+    filter_params = []
+    if start_date:
+        filter_params.append(HouseBookedDay.day >= to_date(start_date))
+    if end_date:
+        filter_params.append(HouseBookedDay.day <= to_date(end_date))
+    return filter_params
+
+
+def order_range_filter(start_date=None, end_date=None):
+    """索引未就绪时，按订单表筛选占用日期范围的订单"""
+    filter_params = [Order.status.in_(BOOKING_STATUS)]
+    if start_date:
+        filter_params.append(Order.end_date >= start_date)
+    if end_date:
+        filter_params.append(Order.begin_date <= end_date)
+    return filter_params
+
+
+def is_ready():
+    """索引是否已经包含历史订单，redis异常时按未就绪处理"""
+    try:
+        return bool(redis_store.exists(READY_KEY))
+    except Exception as e:
+        current_app.logger.error(e)
+        return False
+
+
+def booked_house_query(start_date=None, end_date=None):
+    """查询在日期范围内有被占用日期的房屋编号，返回的是子查询，可直接用于 in_/notin_"""
+    if not is_ready():
+        return db.session.query(Order.house_id).filter(*order_range_filter(start_date, end_date)).distinct()
+    return db.session.query(HouseBookedDay.house_id).filter(*date_range_filter(start_date, end_date)).distinct()
+
+
+def is_house_booked(house_id, start_date, end_date):
+    """判断房屋在日期范围内是否已被预订"""
+    if not is_ready():
+        query = Order.query.filter(Order.house_id == house_id, *order_range_filter(start_date, end_date))
+    else:
+        query = HouseBookedDay.query.filter(HouseBookedDay.house_id == house_id,
+                                            *date_range_filter(start_date, end_date))
+    return db.session.query(query.exists()).scalar()
+
+
+def book_days(order):
+    """将订单占用的日期写入索引，与订单在同一个事务中提交"""
+    for day in iter_days(order.begin_date, order.end_date):
+        db.session.add(HouseBookedDay(house_id=order.house_id, day=day, order=order))
+
+
+def release_days(order_ids):
+    """释放订单占用的日期，与订单状态的修改在同一个事务中提交"""
+    if not order_ids:
+        return 0
+    return HouseBookedDay.query.filter(HouseBookedDay.order_id.in_(order_ids)).delete(synchronize_session=False)
+
+
+def rebuild_index(batch_size=1000):
+    """根据历史订单重建索引，返回写入的记录数"""
+    HouseBookedDay.query.delete(synchronize_session=False)
+    booked = set()
+    rows = []
+    count = 0
+    query = db.session.query(Order.id, Order.house_id, Order.begin_date, Order.end_date).filter(
+        Order.status.in_(BOOKING_STATUS)).order_by(Order.id)
+    for order_id, house_id, begin_date, end_date in query.yield_per(batch_size):
+        for day in iter_days(begin_date, end_date):
+            # 历史数据中可能存在日期重叠的订单，保留先下的订单
+            if (house_id, day) in booked:
+                continue
+            booked.add((house_id, day))
+            rows.append(dict(house_id=house_id, day=day, order_id=order_id))
+        if len(rows) >= batch_size:
+            db.session.bulk_insert_mappings(HouseBookedDay, rows)
+            count += len(rows)
+            rows = []
+    if rows:
+        db.session.bulk_insert_mappings(HouseBookedDay, rows)
+        count += len(rows)
+    db.session.commit()
+    redis_store.set(READY_KEY, 1)
+    return count
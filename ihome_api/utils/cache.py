@@ -0,0 +1,269 @@
+# coding:utf-8
+"""redis 缓存工具"""
+import threading
+import time
+import hashlib
+import logging
+from collections import OrderedDict, Counter
+from flask import current_app, request
+from ihome_api import redis_store, db, contants
+
+# 广播缓存失效的频道，消息内容为失效的键
+INVALIDATE_CHANNEL = 'cache_invalidate'
+# 缓存统计数据在redis中的哈希
+STATS_KEY = 'cache_stats'
+# 负缓存的标记，表示数据不存在
+MISSING = object()
+
+
+def etag_key(key):
+    """与缓存数据一起保存的ETag"""
+    return '%s_etag' % key
+
+
+def make_etag(value):
+    """根据缓存的json数据计算ETag，数据不变时ETag不变"""
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8')
+    return hashlib.md5(value).hexdigest()
+
+
+def is_not_modified(etag):
+    """客户端通过 If-None-Match 带来的ETag与当前数据一致时返回 True"""
+    return bool(etag) and request.if_none_match.contains(etag)
+
+
+def not_modified_response(etag):
+    """304响应，不返回数据"""
+    return '', 304, {'ETag': '"%s"' % etag}
+
+
+def json_response(body, etag=None):
+    """返回json字符串，带上ETag方便客户端下次条件请求"""
+    headers = {'Content-Type': 'application/json'}
+    if etag:
+        headers['ETag'] = '"%s"' % etag
+    return body, 200, headers
+
+
+def _fresh_key(key):
+    """数据新鲜期的标记，标记过期后数据仍可使用，但需要后台刷新"""
+    return '%s_fresh' % key
+
+
+def _lock_key(key):
+    """刷新锁，保证同一时间只有一个请求在刷新"""
+    return '%s_refresh_lock' % key
+
+
+def set_refresh_ahead(key, value, expires):
+    """保存数据和ETag，新鲜期为 expires 秒，数据本身保留到 2 * expires 秒"""
+    pipeline = redis_store.pipeline()
+    pipeline.setex(key, expires * 2, value)
+    pipeline.setex(etag_key(key), expires * 2, make_etag(value))
+    pipeline.setex(_fresh_key(key), expires, 1)
+    pipeline.execute()
+
+
+def expire_refresh_ahead(key):
+    """数据源发生变化时结束新鲜期，下一个请求会在后台刷新数据"""
+    redis_store.delete(_fresh_key(key))
+
+
+def _refresh_in_background(key, builder, expires):
+    """在后台线程中重建数据，完成后释放刷新锁"""
+    app = current_app._get_current_object()
+
+    def refresh():
+        with app.app_context():
+            try:
+                set_refresh_ahead(key, builder(), expires)
+            except Exception as e:
+                app.logger.error(e)
+            finally:
+                db.session.remove()
+                try:
+                    redis_store.delete(_lock_key(key))
+                except Exception as e:
+                    app.logger.error(e)
+
+    thread = threading.Thread(target=refresh)
+    thread.daemon = True
+    thread.start()
+
+
+def _refresh_if_stale(key, builder, expires, fresh):
+    """新鲜期已过时，由抢到刷新锁的请求在后台重建数据"""
+    if fresh:
+        return
+    try:
+        if redis_store.set(_lock_key(key), 1, nx=True, ex=contants.CACHE_REFRESH_LOCK_EXPIRES):
+            _refresh_in_background(key, builder, expires)
+    except Exception as e:
+        current_app.logger.error(e)
+
+
+def get_refresh_ahead(key, builder, expires):
+    """读取提前刷新的缓存数据
+
+    新鲜期内直接返回缓存；新鲜期已过但数据还在时，仍返回旧数据，并由抢到刷新锁的一个请求在后台重建；
+    只有缓存完全不存在（如首次访问）时才在当前请求中重建，避免缓存过期的瞬间所有请求同时查询数据库。
+
+    :param key: 缓存的键
+    :param builder: 重建数据的函数，返回 json 字符串，在后台线程中调用时只有应用上下文
+    :param expires: 新鲜期，单位秒
+    :return: (json 字符串, ETag)
+    """
+    try:
+        pipeline = redis_store.pipeline(transaction=False)
+        pipeline.get(key)
+        pipeline.get(etag_key(key))
+        pipeline.exists(_fresh_key(key))
+        value, etag, fresh = pipeline.execute()
+    except Exception as e:
+        current_app.logger.error(e)
+        value, etag, fresh = None, None, False
+    if value is not None:
+        _refresh_if_stale(key, builder, expires, fresh)
+        return value.decode('utf-8'), etag.decode('utf-8') if etag else make_etag(value)
+    value = builder()
+    try:
+        set_refresh_ahead(key, value, expires)
+    except Exception as e:
+        current_app.logger.error(e)
+    return value, make_etag(value)
+
+
+def get_refresh_ahead_etag(key, builder, expires):
+    """条件请求时只读取ETag，不读取数据，新鲜期已过时同样触发后台刷新"""
+    try:
+        pipeline = redis_store.pipeline(transaction=False)
+        pipeline.get(etag_key(key))
+        pipeline.exists(_fresh_key(key))
+        etag, fresh = pipeline.execute()
+    except Exception as e:
+        current_app.logger.error(e)
+        return None
+    if etag is None:
+        return None
+    _refresh_if_stale(key, builder, expires, fresh)
+    return etag.decode('utf-8')
+
+
+class LocalCache(object):
+    """进程内的LRU缓存，放在redis之前，热点数据不需要访问网络
+
+    每条数据带有效期，超过容量时淘汰最久未使用的数据。其他进程修改数据后通过redis的发布订阅广播失效，
+    广播丢失时最多读到有效期内的旧数据。
+    """
+
+    def __init__(self, max_size, expires):
+        self.max_size = max_size
+        self.expires = expires
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _local_caches.append(self)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expire_at = item
+            if expire_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time() + self.expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_caches = []
+_subscriber = None
+_subscriber_lock = threading.Lock()
+
+
+def _listen_invalidate():
+    """订阅缓存失效的广播，删除本进程中的缓存，连接断开后重新订阅"""
+    while True:
+        try:
+            pubsub = redis_store.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATE_CHANNEL)
+            # 断线期间可能丢失了广播，重新订阅后清空本地缓存
+            for local_cache in _local_caches:
+                local_cache.clear()
+            while True:
+                # 连接设置了读超时，这里按间隔轮询，不使用会一直阻塞读取的 listen()
+                message = pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                key = message['data'].decode('utf-8')
+                for local_cache in _local_caches:
+                    local_cache.delete(key)
+        except Exception as e:
+            logging.error(e)
+            time.sleep(1)
+
+
+def start_invalidate_subscriber():
+    """在当前进程中启动订阅线程，重复调用只启动一次"""
+    global _subscriber
+    if _subscriber is not None:
+        return
+    with _subscriber_lock:
+        if _subscriber is None:
+            _subscriber = threading.Thread(target=_listen_invalidate)
+            _subscriber.daemon = True
+            _subscriber.start()
+
+
+def invalidate(*keys):
+    """删除redis中的缓存，并广播通知所有进程删除本地缓存"""
+    if not keys:
+        return
+    pipeline = redis_store.pipeline()
+    pipeline.delete(*keys)
+    pipeline.delete(*[etag_key(key) for key in keys])
+    for key in keys:
+        pipeline.publish(INVALIDATE_CHANNEL, key)
+    pipeline.execute()
+    for local_cache in _local_caches:
+        for key in keys:
+            local_cache.delete(key)
+
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_stats_flushed_at = [time.time()]
+
+
+def incr_stat(name, amount=1):
+    """累加缓存统计数据，先在进程内累计，定期合并到redis的 cache_stats 哈希中"""
+    with _stats_lock:
+        _stats[name] += amount
+        if time.time() - _stats_flushed_at[0] < contants.CACHE_STATS_FLUSH_INTERVAL:
+            return
+        stats = dict(_stats)
+        _stats.clear()
+        _stats_flushed_at[0] = time.time()
+    try:
+        pipeline = redis_store.pipeline(transaction=False)
+        for field, value in stats.items():
+            pipeline.hincrby(STATS_KEY, field, value)
+        pipeline.execute()
+    except Exception as e:
+        logging.error(e)
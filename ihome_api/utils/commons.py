@@ -24,3 +24,14 @@ def login_required(view_func):
             return jsonify(errno=RET.SESSIONERR, errmsg='用户未登录')
 
     return wrapper
+
+
+def current_user():
+    """当前登录用户的资料（字典），在 login_required 装饰的视图中使用
+
+    第一次调用时从redis缓存或数据库加载，保存在g对象中，同一个请求中不再重复加载，用户不存在时返回 None
+    """
+    if 'current_user' not in g:
+        from ihome_api.utils.user_cache import load_profile
+        g.current_user = load_profile(g.user_id)
+    return g.current_user
@@ -0,0 +1,63 @@
+# coding:utf-8
+"""检查接口的主要查询是否使用了索引
+
+对各接口中代表性的查询执行 EXPLAIN（sqlite 为 EXPLAIN QUERY PLAN），
+mysql 中访问类型为 ALL、sqlite 中为不带索引的 SCAN 时视为全表扫描。
+"""
+import datetime
+from ihome_api import db
+from ihome_api.models import House, Order, User, HouseBookedDay
+from ihome_api.utils import pagination
+from ihome_api.api_1_0.houses import HOUSE_LIST_SORT_COLUMNS
+
+
+def hot_queries(area_id=1, house_id=1, user_id=1, mobile='13800000000'):
+    """返回 [(名称, 查询)]，查询条件的取值不影响执行计划"""
+    today = datetime.date.today()
+    end = today + datetime.timedelta(days=7)
+    queries = [
+        ('login: user by mobile', User.query.filter_by(mobile=mobile)),
+        ('save_order: booked days of house', HouseBookedDay.query.filter(
+            HouseBookedDay.house_id == house_id, HouseBookedDay.day >= today, HouseBookedDay.day <= end)),
+        ('house_list: booked houses in date range', db.session.query(HouseBookedDay.house_id).filter(
+            HouseBookedDay.day >= today, HouseBookedDay.day <= end)),
+        ('order conflict: orders of house in date range', Order.query.filter(
+            Order.house_id == house_id, Order.begin_date <= end, Order.end_date >= today)),
+        ('user_orders: landlord orders', Order.query.join(House, Order.house_id == House.id).filter(
+            House.user_id == user_id).order_by(Order.create_time.desc(), Order.id.desc())),
+        ('house_orders: orders of house by time', Order.query.filter(
+            Order.house_id == house_id).order_by(Order.create_time)),
+    ]
+    # 房屋列表支持的每种排序
+    for sort_key, columns in sorted(HOUSE_LIST_SORT_COLUMNS.items()):
+        queries.append(('house_list: area sorted by %s' % sort_key, House.query.filter(
+            House.area_id == area_id).order_by(*pagination.order_by(columns)).limit(10)))
+    return queries
+
+
+def explain(query):
+    """执行查询的 EXPLAIN，返回 (执行计划的各行, 是否有全表扫描)"""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    compiled = query.statement.compile(dialect=dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    if dialect.name == 'sqlite':
+        rows = connection.execute('EXPLAIN QUERY PLAN ' + str(compiled), params).fetchall()
+        details = [row[-1] for row in rows]
+        full_scan = any(detail.startswith('SCAN') and 'INDEX' not in detail for detail in details)
+        return details, full_scan
+    result = connection.execute('EXPLAIN ' + str(compiled), params)
+    keys = result.keys()
+    rows = [dict(zip(keys, row)) for row in result.fetchall()]
+    full_scan = any(row.get('type') == 'ALL' for row in rows)
+    details = ['%s type=%s key=%s rows=%s' % (row.get('table'), row.get('type'), row.get('key'), row.get('rows'))
+               for row in rows]
+    return details, full_scan
+
+
+def check():
+    """检查所有主要查询，返回 [(名称, 执行计划的各行, 是否有全表扫描)]"""
+    return [(name,) + explain(query) for name, query in hot_queries()]
@@ -0,0 +1,162 @@
+# coding:utf-8
+"""房屋设施的位图索引
+
+每个设施、每个城区在 redis 中维护一个位图，第 N 位表示编号为 N 的房屋是否具备该设施/属于该城区。
+按设施筛选时一次取回相关位图，在进程内按位与求交集，并统计剩余各设施的数量（分面计数），
+不需要为每个设施关联一次 ih_house_facility 表。
+
+位图需要运行 rebuild_facility_index 根据已有房屋建立，完成后设置 READY_KEY，
+没有该标记时按设施筛选回退到数据库查询。
+"""
+from sqlalchemy import func
+from ihome_api import redis_store, db
+from ihome_api.models import House, house_facility
+
+# 保存所有已建立位图的设施编号
+FACILITY_IDS_KEY = 'facility_bits_ids'
+# 位图重建完成的标记
+READY_KEY = 'facility_index_ready'
+
+
+def facility_key(facility_id):
+    return 'facility_bits_%s' % facility_id
+
+
+def area_key(area_id):
+    return 'area_bits_%s' % area_id
+
+
+def index_house(house, facility_ids=None):
+    """写入房屋的城区和设施位，房屋新增或设施变化后调用"""
+    if facility_ids is None:
+        facility_ids = [facility.id for facility in house.facilities]
+    pipeline = redis_store.pipeline()
+    pipeline.setbit(area_key(house.area_id), house.id, 1)
+    for facility_id in facility_ids:
+        pipeline.setbit(facility_key(facility_id), house.id, 1)
+        pipeline.sadd(FACILITY_IDS_KEY, facility_id)
+    pipeline.execute()
+
+
+def rebuild(batch_size=1000):
+    """根据数据库全量重建位图，返回房屋数量"""
+    # 重建期间位图不完整，先删除就绪标记，筛选回退到数据库
+    redis_store.delete(READY_KEY)
+    keys = list(redis_store.scan_iter('facility_bits_*')) + list(redis_store.scan_iter('area_bits_*'))
+    if keys:
+        redis_store.delete(*keys)
+    count = 0
+    pipeline = redis_store.pipeline()
+    for house_id, area_id in db.session.query(House.id, House.area_id).yield_per(batch_size):
+        pipeline.setbit(area_key(area_id), house_id, 1)
+        count += 1
+        if count % batch_size == 0:
+            pipeline.execute()
+    pipeline.execute()
+    query = db.session.query(house_facility.c.house_id, house_facility.c.facility_id)
+    for index, (house_id, facility_id) in enumerate(query.yield_per(batch_size), 1):
+        pipeline.setbit(facility_key(facility_id), house_id, 1)
+        pipeline.sadd(FACILITY_IDS_KEY, facility_id)
+        if index % batch_size == 0:
+            pipeline.execute()
+    pipeline.execute()
+    redis_store.set(READY_KEY, 1)
+    return count
+
+
+def _bits(data, size):
+    """将 redis 位图转换为整数，位图长度不同，先在末尾补齐到 size 字节"""
+    return int.from_bytes((data or b'').ljust(size, b'\0'), 'big')
+
+
+def _bit_count(value):
+    return bin(value).count('1')
+
+
+def _house_ids(value, size):
+    """取出整数位图中为 1 的房屋编号"""
+    data = value.to_bytes(size, 'big')
+    house_ids = []
+    for index, byte in enumerate(data):
+        if not byte:
+            continue
+        for offset in range(8):
+            if byte & (0x80 >> offset):
+                house_ids.append(index * 8 + offset)
+    return house_ids
+
+
+def search(facility_ids, area_id=None, exclude_house_ids=None, include_house_ids=None):
+    """按设施筛选房屋
+
+    :param facility_ids: 要求同时具备的设施编号
+    :param area_id: 城区编号，为空表示不限
+    :param exclude_house_ids: 需要排除的房屋编号，如日期范围内已被预订的房屋
+    :param include_house_ids: 只在这些房屋中筛选，如关键词检索的结果，为None表示不限
+    :return: (符合条件的房屋编号列表, {其余设施编号: 在结果中具备该设施的房屋数量})
+    """
+    facility_ids = set(int(facility_id) for facility_id in facility_ids)
+    pipeline = redis_store.pipeline(transaction=False)
+    pipeline.exists(READY_KEY)
+    pipeline.smembers(FACILITY_IDS_KEY)
+    ready, all_facility_ids = pipeline.execute()
+    if not ready:
+        return search_db(facility_ids, area_id, exclude_house_ids, include_house_ids)
+    all_facility_ids = sorted(int(facility_id) for facility_id in all_facility_ids)
+    keys = [facility_key(facility_id) for facility_id in all_facility_ids]
+    if area_id:
+        keys.append(area_key(area_id))
+    values = redis_store.mget(keys) if keys else []
+    size = max([len(value) for value in values if value] or [0])
+    bitmaps = dict(zip(all_facility_ids, (_bits(value, size) for value in values)))
+
+    if not facility_ids.issubset(bitmaps):
+        # 有设施没有任何房屋具备
+        return [], dict((facility_id, 0) for facility_id in all_facility_ids if facility_id not in facility_ids)
+    result = (1 << size * 8) - 1
+    for facility_id in facility_ids:
+        result &= bitmaps[facility_id]
+    if area_id:
+        result &= _bits(values[-1], size)
+    for house_id in exclude_house_ids or ():
+        if house_id < size * 8:
+            result &= ~(1 << (size * 8 - 1 - house_id))
+    if include_house_ids is not None:
+        mask = 0
+        for house_id in include_house_ids:
+            if house_id < size * 8:
+                mask |= 1 << (size * 8 - 1 - house_id)
+        result &= mask
+
+    facets = dict((facility_id, _bit_count(result & bitmap))
+                  for facility_id, bitmap in bitmaps.items() if facility_id not in facility_ids)
+    return _house_ids(result, size), facets
+
+
+def search_db(facility_ids, area_id=None, exclude_house_ids=None, include_house_ids=None):
+    """位图未就绪时在数据库中按设施筛选，参数和返回值与 search 相同"""
+    facility_ids = set(int(facility_id) for facility_id in facility_ids)
+    all_facility_ids = [facility_id for facility_id, in db.session.query(house_facility.c.facility_id).distinct()]
+    if include_house_ids is not None and not include_house_ids:
+        return [], dict((facility_id, 0) for facility_id in all_facility_ids if facility_id not in facility_ids)
+    # 同时具备所有设施的房屋
+    matched = db.session.query(house_facility.c.house_id).filter(
+        house_facility.c.facility_id.in_(facility_ids)).group_by(house_facility.c.house_id).having(
+        func.count(house_facility.c.facility_id) == len(facility_ids))
+    query = db.session.query(House.id).filter(House.id.in_(matched))
+    if area_id:
+        query = query.filter(House.area_id == area_id)
+    if exclude_house_ids:
+        query = query.filter(House.id.notin_(exclude_house_ids))
+    if include_house_ids is not None:
+        query = query.filter(House.id.in_(include_house_ids))
+    house_ids = sorted(house_id for house_id, in query)
+
+    facets = dict((facility_id, 0) for facility_id in all_facility_ids if facility_id not in facility_ids)
+    if house_ids:
+        counts = db.session.query(house_facility.c.facility_id, func.count(house_facility.c.house_id)).filter(
+            house_facility.c.house_id.in_(house_ids)).group_by(house_facility.c.facility_id)
+        for facility_id, count in counts:
+            if facility_id in facets:
+                facets[facility_id] = count
+    return house_ids, facets
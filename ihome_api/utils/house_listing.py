@@ -0,0 +1,166 @@
+# coding:utf-8
+"""基于 redis 有序集合的房屋列表
+
+每种排序字段各维护一个全局有序集合和每个城区一个有序集合，成员为补零后的房屋编号，
+同分时按编号排序，与数据库查询的顺序一致。房屋的列表数据预先序列化为 json 保存，
+不带日期筛选的列表页直接用 ZRANGE + MGET 返回，不再查询数据库。
+
+每个有序集合在 VERSION_KEY 哈希中有一个版本号，集合中房屋的数据或分数变化时随机生成新的版本号，
+列表页的ETag由版本号和页码计算，客户端的ETag一致时不需要读取房屋数据。
+"""
+import datetime
+import uuid
+from ihome_api import redis_store, db
+from ihome_api.models import House
+from ihome_api.utils.preload import preload_houses
+from ihome_api.utils import serializer, cache
+
+# 排序方式对应的 (有序集合的排序字段, 是否降序)
+SORT_FIELDS = {
+    'new': ('create_time', True),
+    'booking': ('order_count', True),
+    'price-inc': ('price', False),
+    'price-des': ('price', True),
+}
+# 索引重建完成的标记，没有该标记时列表页回退到数据库查询
+READY_KEY = 'house_rank_ready'
+# 首页幻灯片的候选房屋，只包含设置了主图片的房屋，按订单数排序
+HOME_RANK_KEY = 'house_rank_home'
+# 各有序集合的版本号，字段为有序集合的键
+VERSION_KEY = 'house_rank_version'
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def rank_key(field, area_id=None):
+    """有序集合的键，area_id 为空表示全部城区"""
+    return 'house_rank_%s_%s' % (field, area_id or 'all')
+
+
+def card_key(house_id):
+    """房屋列表数据的键"""
+    return 'house_card_%s' % house_id
+
+
+def _member(house_id):
+    return '%010d' % int(house_id)
+
+
+def _scores(house):
+    return {
+        'create_time': (house.create_time - _EPOCH).total_seconds() if house.create_time else 0,
+        'order_count': house.order_count or 0,
+        'price': house.price or 0,
+    }
+
+
+def _index(pipeline, house):
+    """在管道中写入房屋的列表数据和各排序字段的分数"""
+    pipeline.set(card_key(house.id), serializer.dumps(house.to_basic_dict()))
+    member = _member(house.id)
+    scores = _scores(house)
+    versions = {}
+    # 使用随机的版本号，重建或清空redis后也不会与客户端保存的旧ETag相同
+    version = uuid.uuid4().hex
+    for field, score in scores.items():
+        for key in (rank_key(field), rank_key(field, house.area_id)):
+            pipeline.zadd(key, {member: score})
+            versions[key] = version
+    pipeline.hmset(VERSION_KEY, versions)
+    if house.index_image_url:
+        pipeline.zadd(HOME_RANK_KEY, {member: scores['order_count']})
+    else:
+        pipeline.zrem(HOME_RANK_KEY, member)
+
+
+def index_houses(houses):
+    """新增或更新房屋在列表中的数据，房屋信息、主图片、订单数等变化后调用"""
+    houses = preload_houses(houses)
+    if not houses:
+        return
+    pipeline = redis_store.pipeline()
+    for house in houses:
+        _index(pipeline, house)
+    pipeline.execute()
+
+
+def index_house(house):
+    index_houses([house])
+
+
+def rebuild(batch_size=500):
+    """根据数据库全量重建列表，返回房屋数量"""
+    keys = list(redis_store.scan_iter('house_rank_*'))
+    if keys:
+        redis_store.delete(*keys)
+    count = 0
+    last_id = 0
+    while True:
+        houses = House.query.filter(House.id > last_id).order_by(House.id).limit(batch_size).all()
+        if not houses:
+            break
+        index_houses(houses)
+        count += len(houses)
+        last_id = houses[-1].id
+        db.session.expunge_all()
+    redis_store.set(READY_KEY, 1)
+    return count
+
+
+def query_page(area_id, sort_key, page, per_page, is_not_modified=None):
+    """从有序集合中读取一页列表数据
+
+    :param is_not_modified: 判断客户端的ETag是否与页面一致的函数，一致时不读取房屋数据
+    :return: (总页数, 房屋 json 字符串列表, ETag)，ETag 与客户端一致时房屋列表为 None，
+             没有版本号时 ETag 为 None；索引未就绪或数据不完整时返回 None，由调用方回退到数据库
+    """
+    field, desc = SORT_FIELDS.get(sort_key, SORT_FIELDS['new'])
+    key = rank_key(field, area_id)
+    start = (page - 1) * per_page
+    pipeline = redis_store.pipeline(transaction=False)
+    pipeline.exists(READY_KEY)
+    pipeline.hget(VERSION_KEY, key)
+    pipeline.zcard(key)
+    if desc:
+        pipeline.zrevrange(key, start, start + per_page - 1)
+    else:
+        pipeline.zrange(key, start, start + per_page - 1)
+    ready, version, total, members = pipeline.execute()
+    if not ready:
+        return None
+    total_page = (total + per_page - 1) // per_page
+    etag = None
+    if version:
+        etag = _page_etag(key, version.decode('utf-8'), desc, page, per_page)
+        if is_not_modified is not None and is_not_modified(etag):
+            return total_page, None, etag
+    cards = _cards(members)
+    if cards is None:
+        return None
+    return total_page, cards, etag
+
+
+def _page_etag(key, version, desc, page, per_page):
+    """列表页的ETag，有序集合的版本号不变时，同一页的数据不变"""
+    return cache.make_etag('%s_%s_%s_%s_%s' % (key, version, int(desc), page, per_page))
+
+
+def _cards(members):
+    """批量读取房屋的列表数据，有缺失时返回 None"""
+    if not members:
+        return []
+    cards = redis_store.mget([card_key(int(member)) for member in members])
+    if None in cards:
+        return None
+    return [card.decode('utf-8') for card in cards]
+
+
+def top_houses(count):
+    """读取订单数最多的 count 个设置了主图片的房屋，索引未就绪或数据不完整时返回 None"""
+    pipeline = redis_store.pipeline(transaction=False)
+    pipeline.exists(READY_KEY)
+    pipeline.zrevrange(HOME_RANK_KEY, 0, count - 1)
+    ready, members = pipeline.execute()
+    if not ready:
+        return None
+    return _cards(members)
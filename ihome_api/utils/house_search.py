@@ -0,0 +1,113 @@
+# coding:utf-8
+"""房屋标题和地址的全文检索
+
+中文没有天然的分词边界，这里对连续的中文字符按单字和相邻两字（二元组）切分，
+英文和数字按整词切分，在 redis 中为每个词维护一个包含该词的房屋编号集合（倒排索引）。
+检索时对关键词做同样的切分，对各个词的集合求交集。
+
+已有房屋需要运行 rebuild_house_search 写入索引，完成后设置 READY_KEY，
+没有该标记时检索回退到数据库的 LIKE 查询。
+"""
+import re
+from sqlalchemy import or_
+from ihome_api import redis_store, db
+from ihome_api.models import House
+
+_TOKEN_RE = re.compile(r'[\u4e00-\u9fff]+|[a-z0-9]+')
+# 索引重建完成的标记，不能以 house_kw_ 开头，否则会与词的键冲突
+READY_KEY = 'house_search_ready'
+
+
+def token_key(token):
+    """包含该词的房屋编号集合"""
+    return 'house_kw_%s' % token
+
+
+def house_tokens_key(house_id):
+    """房屋当前被索引的词，修改房屋信息时用于删除旧的词"""
+    return 'house_kw_tokens_%s' % house_id
+
+
+def tokenize(text):
+    """索引用的切分，中文输出单字和二元组"""
+    tokens = set()
+    for word in _TOKEN_RE.findall((text or '').lower()):
+        if word[0] < '\u4e00':
+            tokens.add(word)
+            continue
+        tokens.update(word)
+        tokens.update(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def query_tokens(text):
+    """检索用的切分，中文只用二元组（单个汉字时用单字），选择性更好"""
+    tokens = set()
+    for word in _TOKEN_RE.findall((text or '').lower()):
+        if word[0] < '\u4e00' or len(word) == 1:
+            tokens.add(word)
+        else:
+            tokens.update(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def _house_text(house):
+    return '%s %s' % (house.title or '', house.address or '')
+
+
+def index_house(house, pipeline=None):
+    """新增或更新房屋的索引，房屋标题或地址变化后调用"""
+    tokens = tokenize(_house_text(house))
+    old_tokens = set(token.decode('utf-8') for token in redis_store.smembers(house_tokens_key(house.id)))
+    execute = pipeline is None
+    if pipeline is None:
+        pipeline = redis_store.pipeline()
+    for token in old_tokens - tokens:
+        pipeline.srem(token_key(token), house.id)
+    for token in tokens - old_tokens:
+        pipeline.sadd(token_key(token), house.id)
+    pipeline.delete(house_tokens_key(house.id))
+    if tokens:
+        pipeline.sadd(house_tokens_key(house.id), *tokens)
+    if execute:
+        pipeline.execute()
+
+
+def rebuild(batch_size=500):
+    """根据数据库全量重建索引，返回房屋数量"""
+    # 重建期间索引不完整，先删除就绪标记，检索回退到数据库
+    redis_store.delete(READY_KEY)
+    keys = list(redis_store.scan_iter('house_kw_*'))
+    for i in range(0, len(keys), batch_size):
+        redis_store.delete(*keys[i:i + batch_size])
+    count = 0
+    pipeline = redis_store.pipeline()
+    query = db.session.query(House.id, House.title, House.address)
+    for count, (house_id, title, address) in enumerate(query.yield_per(batch_size), 1):
+        tokens = tokenize('%s %s' % (title or '', address or ''))
+        for token in tokens:
+            pipeline.sadd(token_key(token), house_id)
+        if tokens:
+            pipeline.sadd(house_tokens_key(house_id), *tokens)
+        if count % batch_size == 0:
+            pipeline.execute()
+    pipeline.execute()
+    redis_store.set(READY_KEY, 1)
+    return count
+
+
+def search(keyword):
+    """检索标题或地址包含关键词的房屋，返回房屋编号集合；关键词中没有可检索的词时返回 None"""
+    tokens = query_tokens(keyword)
+    if not tokens:
+        return None
+    if not redis_store.exists(READY_KEY):
+        return search_db(tokens)
+    return set(int(house_id) for house_id in redis_store.sinter([token_key(token) for token in tokens]))
+
+
+def search_db(tokens):
+    """索引未就绪时在数据库中检索，每个词都要出现在标题或地址中，与索引的结果一致"""
+    filter_params = [or_(House.title.like('%%%s%%' % token), House.address.like('%%%s%%' % token))
+                     for token in tokens]
+    return set(house_id for house_id, in db.session.query(House.id).filter(*filter_params))
@@ -0,0 +1,55 @@
+# coding:utf-8
+"""超时订单的自动取消
+
+待接单的订单从下单时间开始计时，待支付的订单从接单时间（订单的更新时间）开始计时，
+超过期限后按批次更新为已取消，并释放订单占用的日期。由 celery beat 定时调用。
+"""
+import datetime
+from ihome_api import db, contants
+from ihome_api.models import Order
+from ihome_api.utils import availability, cache, order_stats
+
+# (订单状态, 计时开始的字段, 期限秒数, 取消原因)
+EXPIRE_RULES = (
+    ("WAIT_ACCEPT", Order.create_time, contants.ORDER_ACCEPT_EXPIRES, "房东超时未接单，订单已自动取消"),
+    ("WAIT_PAYMENT", Order.update_time, contants.ORDER_PAYMENT_EXPIRES, "超时未支付，订单已自动取消"),
+)
+
+
+def _expire_batch(status, deadline_column, deadline, reason, last_id, batch_size):
+    """取消一批超时订单，返回 (订单编号列表, 房屋编号集合)"""
+    # 锁住选出的订单，避免取消的同时被房东接单或被房客支付
+    rows = db.session.query(Order.id, Order.house_id, Order.begin_date, Order.end_date, Order.house_price).filter(
+        Order.status == status, deadline_column < deadline, Order.id > last_id
+    ).order_by(Order.id).limit(batch_size).with_for_update().all()
+    if not rows:
+        return [], set()
+    order_ids = [row.id for row in rows]
+    try:
+        Order.query.filter(Order.id.in_(order_ids), Order.status == status).update(
+            {Order.status: "CANCELED", Order.comment: reason}, synchronize_session=False)
+        availability.release_days(order_ids)
+        order_stats.record(rows, status, "CANCELED")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return order_ids, set(row.house_id for row in rows)
+
+
+def expire_orders(now=None, batch_size=contants.ORDER_EXPIRE_BATCH_SIZE):
+    """取消所有超过期限的订单，每批一个事务，返回取消的订单数量"""
+    now = now or datetime.datetime.now()
+    count = 0
+    for status, deadline_column, expires, reason in EXPIRE_RULES:
+        deadline = now - datetime.timedelta(seconds=expires)
+        last_id = 0
+        while True:
+            order_ids, house_ids = _expire_batch(status, deadline_column, deadline, reason, last_id, batch_size)
+            if not order_ids:
+                break
+            count += len(order_ids)
+            last_id = order_ids[-1]
+            # 房屋的可预订日期发生变化，删除相关房屋的缓存
+            cache.invalidate(*['house_info_%s' % house_id for house_id in house_ids])
+    return count
@@ -0,0 +1,121 @@
+# coding:utf-8
+"""房屋按月汇总的订单统计
+
+每个订单按所处的状态对 ih_house_month_stat 贡献固定的数值：
+所有订单在入住日期所在的月份计一次预订；已接单的订单计一次接单，并把占用的天数和金额按月拆分计入；
+已完成的订单再计一次完成。订单状态变化时只需加上新状态的贡献、减去旧状态的贡献，不需要重新扫描订单表。
+"""
+import calendar
+import datetime
+from collections import defaultdict, Counter
+from sqlalchemy.exc import IntegrityError
+from ihome_api import db
+from ihome_api.models import HouseMonthStat, Order
+from ihome_api.utils.availability import to_date
+
+# 已被房东接单的订单状态
+ACCEPTED_STATUS = ("WAIT_PAYMENT", "PAID", "WAIT_COMMENT", "COMPLETE")
+# 统计的字段
+FIELDS = ("booking_count", "accept_count", "complete_count", "booked_days", "revenue")
+
+
+def month_of(day):
+    """日期所在的月份，用当月第一天表示"""
+    return to_date(day).replace(day=1)
+
+
+def days_in_month(month):
+    return calendar.monthrange(month.year, month.month)[1]
+
+
+def _split_days(begin_date, end_date):
+    """将入住日期范围（包含起止日期）按月拆分，返回 [(月份, 天数)]"""
+    day = to_date(begin_date)
+    end = to_date(end_date)
+    parts = []
+    while day <= end:
+        month = month_of(day)
+        month_end = month.replace(day=days_in_month(month))
+        last = min(month_end, end)
+        parts.append((month, (last - day).days + 1))
+        day = last + datetime.timedelta(days=1)
+    return parts
+
+
+def _contribute(deltas, order, status, sign):
+    """将订单在 status 状态下的贡献乘以 sign 累加到 deltas 中"""
+    if status is None:
+        return
+    begin_month = month_of(order.begin_date)
+    deltas[(order.house_id, begin_month)]["booking_count"] += sign
+    if status not in ACCEPTED_STATUS:
+        return
+    deltas[(order.house_id, begin_month)]["accept_count"] += sign
+    if status == "COMPLETE":
+        deltas[(order.house_id, begin_month)]["complete_count"] += sign
+    for month, days in _split_days(order.begin_date, order.end_date):
+        deltas[(order.house_id, month)]["booked_days"] += sign * days
+        deltas[(order.house_id, month)]["revenue"] += sign * days * order.house_price
+
+
+def _apply(deltas):
+    """将增量写入统计表，mysql 使用 INSERT ... ON DUPLICATE KEY UPDATE，其他数据库先更新、没有记录时再插入
+
+    并发的事务可能在更新和插入之间插入了同一个月的记录，插入在保存点中执行，主键冲突时回滚到保存点再更新一次，
+    不影响同一个事务中的订单和预订日期。
+    """
+    table = HouseMonthStat.__table__
+    dialect = db.session.get_bind().dialect.name
+    for (house_id, month), delta in deltas.items():
+        delta = dict((field, value) for field, value in delta.items() if value)
+        if not delta:
+            continue
+        values = dict((field, delta.get(field, 0)) for field in FIELDS)
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table).values(house_id=house_id, month=month, **values)
+            db.session.execute(stmt.on_duplicate_key_update(
+                **dict((field, table.c[field] + value) for field, value in delta.items())))
+            continue
+        update = table.update().where(
+            (table.c.house_id == house_id) & (table.c.month == month)
+        ).values(**dict((field, table.c[field] + value) for field, value in delta.items()))
+        if db.session.execute(update).rowcount:
+            continue
+        savepoint = db.session.begin_nested()
+        try:
+            db.session.execute(table.insert().values(house_id=house_id, month=month, **values))
+            savepoint.commit()
+        except IntegrityError:
+            savepoint.rollback()
+            db.session.execute(update)
+
+
+def record(orders, old_status, new_status):
+    """订单状态从 old_status 变为 new_status 时更新统计，与订单状态的修改在同一个事务中提交
+
+    :param orders: 订单对象或包含 house_id、begin_date、end_date、house_price 的查询结果
+    :param old_status: 原状态，新下的订单为 None
+    :param new_status: 新状态
+    """
+    deltas = defaultdict(Counter)
+    for order in orders:
+        _contribute(deltas, order, new_status, 1)
+        _contribute(deltas, order, old_status, -1)
+    _apply(deltas)
+
+
+def rebuild(batch_size=1000):
+    """根据历史订单重建统计表，返回统计的订单数量"""
+    HouseMonthStat.query.delete(synchronize_session=False)
+    deltas = defaultdict(Counter)
+    count = 0
+    query = db.session.query(Order.house_id, Order.begin_date, Order.end_date, Order.house_price, Order.status)
+    for count, order in enumerate(query.yield_per(batch_size), 1):
+        _contribute(deltas, order, order.status, 1)
+    rows = [dict(house_id=house_id, month=month, **dict((field, delta[field]) for field in FIELDS))
+            for (house_id, month), delta in deltas.items()]
+    for i in range(0, len(rows), batch_size):
+        db.session.bulk_insert_mappings(HouseMonthStat, rows[i:i + batch_size])
+    db.session.commit()
+    return count
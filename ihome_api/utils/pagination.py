@@ -0,0 +1,70 @@
+# coding:utf-8
+"""基于游标（keyset）的分页
+
+游标中保存上一页最后一条数据的排序字段值和主键，下一页直接从该位置继续查询，
+不需要 COUNT(*) 和 OFFSET，翻到第 N 页的开销与第 1 页相同。
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def encode_cursor(values):
+    """将排序字段的值编码为不透明的游标字符串"""
+    values = [v.strftime(DATETIME_FORMAT) if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, columns):
+    """解析游标，返回与 columns 对应的排序字段值，游标无效时抛出 ValueError"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError('invalid cursor')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('invalid cursor')
+    result = []
+    for value, (column, desc) in zip(values, columns):
+        if value is not None and column.type.python_type is datetime:
+            value = datetime.strptime(value, DATETIME_FORMAT)
+        result.append(value)
+    return result
+
+
+def keyset_filter(columns, values):
+    """构造 "排在游标之后" 的过滤条件
+
+    :param columns: [(字段, 是否降序), ...]，最后一个字段必须是唯一的（一般为主键）
+    :param values: 游标中对应字段的值
+    """
+    clauses = []
+    for i, (column, desc) in enumerate(columns):
+        equals = [c == v for (c, _), v in zip(columns[:i], values[:i])]
+        after = column < values[i] if desc else column > values[i]
+        clauses.append(and_(*(equals + [after])))
+    return or_(*clauses)
+
+
+def order_by(columns):
+    """按 columns 生成排序条件"""
+    return [column.desc() if desc else column.asc() for column, desc in columns]
+
+
+def paginate(query, columns, cursor, per_page):
+    """按游标分页查询
+
+    :return: (当前页数据, 下一页游标)，没有下一页时游标为 None
+    """
+    if cursor:
+        query = query.filter(keyset_filter(columns, decode_cursor(cursor, columns)))
+    # 多查一条用来判断是否还有下一页
+    items = query.order_by(*order_by(columns)).limit(per_page + 1).all()
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column, desc in columns])
+    return items, next_cursor
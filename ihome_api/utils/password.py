@@ -0,0 +1,59 @@
+# coding:utf-8
+"""密码的哈希和校验
+
+PBKDF2 计算量大，放在有界的线程池中执行：同时计算的数量不超过 PASSWORD_HASH_WORKERS，
+排队的请求超过 PASSWORD_HASH_QUEUE_SIZE 或等待超过 PASSWORD_HASH_TIMEOUT 秒时直接返回繁忙，
+登录高峰时不会占满所有请求线程、拖慢其他接口。hashlib 计算时会释放GIL，线程池可以并行计算。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordHashBusy(Exception):
+    """排队的密码计算过多"""
+
+
+_executor = None
+_slots = None
+_timeout = None
+
+
+def init_app(app):
+    """根据配置创建线程池"""
+    global _executor, _slots, _timeout
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = ThreadPoolExecutor(max_workers=app.config['PASSWORD_HASH_WORKERS'])
+    _slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_QUEUE_SIZE'])
+    _timeout = app.config['PASSWORD_HASH_TIMEOUT']
+
+
+def _run(func, *args):
+    """在线程池中执行 func，排队已满时抛出 PasswordHashBusy"""
+    if not _slots.acquire(timeout=_timeout):
+        raise PasswordHashBusy()
+    try:
+        future = _executor.submit(func, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def hash_password(password):
+    """按当前配置的算法和迭代次数计算密码哈希"""
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'],
+                current_app.config['PASSWORD_HASH_SALT_LENGTH'])
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """保存的哈希使用的算法或迭代次数与当前配置不同时返回 True，如 pbkdf2:sha256:150000"""
+    method = password_hash.split('$', 1)[0]
+    return method != current_app.config['PASSWORD_HASH_METHOD']
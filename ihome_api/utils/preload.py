@@ -0,0 +1,46 @@
+# coding:utf-8
+"""列表数据序列化前批量加载关联对象
+
+to_basic_dict 会访问 house.area、house.user、order.house 等关联对象，逐条懒加载时
+一页数据会产生 1 + 2N 次查询。这里对整页数据按外键收集编号，每种关联对象只查询一次，
+再直接写入对象的关联属性，使序列化时不再触发懒加载。
+"""
+from sqlalchemy.orm.attributes import set_committed_value
+from ihome_api.models import User, Area, House
+
+
+def _preload(objs, foreign_key, model, attr):
+    """为 objs 批量加载 attr 关联对象，已经加载过的对象跳过"""
+    objs = [obj for obj in objs if attr not in obj.__dict__]
+    ids = set(getattr(obj, foreign_key) for obj in objs)
+    if not ids:
+        return []
+    related = dict((item.id, item) for item in model.query.filter(model.id.in_(ids)).all())
+    for obj in objs:
+        set_committed_value(obj, attr, related.get(getattr(obj, foreign_key)))
+    return list(related.values())
+
+
+def preload_houses(houses):
+    """批量加载房屋所属的城区和房东"""
+    houses = list(houses)
+    _preload(houses, 'area_id', Area, 'area')
+    _preload(houses, 'user_id', User, 'user')
+    return houses
+
+
+def preload_orders(orders):
+    """批量加载订单对应的房屋"""
+    orders = list(orders)
+    _preload(orders, 'house_id', House, 'house')
+    return orders
+
+
+def houses_to_basic_dicts(houses):
+    """批量将房屋转换为列表页使用的字典数据"""
+    return [house.to_basic_dict() for house in preload_houses(houses)]
+
+
+def orders_to_basic_dicts(orders):
+    """批量将订单转换为列表页使用的字典数据"""
+    return [order.to_basic_dict() for order in preload_orders(orders)]
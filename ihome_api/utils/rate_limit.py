@@ -0,0 +1,123 @@
+# coding:utf-8
+"""基于redis的令牌桶限流
+
+每个桶保存在一个哈希中（剩余令牌数和上次更新时间），取令牌的判断和更新在一个Lua脚本中完成，
+多个进程并发请求时也是原子的，只需要一次redis往返。桶的容量为 capacity，每 period 秒补满，
+短时间内允许突发 capacity 次请求，之后按 capacity / period 的速度放行。
+
+默认限制写在装饰器参数中，可以在配置 RATE_LIMITS 中按名称覆盖。redis异常时放行，不影响正常业务。
+"""
+import time
+from functools import wraps
+from flask import current_app, jsonify, request
+from ihome_api import redis_store
+from ihome_api.utils.response_code import RET
+
+# KEYS[1] 桶的键；ARGV 容量、每毫秒补充的令牌数、当前时间（毫秒）、本次消耗的令牌数
+# cost 为 0 时只检查是否还有令牌，不消耗；为负数时退还令牌，不超过容量
+# 返回 {是否放行, 剩余令牌数, 需要等待的毫秒数}
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local need = math.max(cost, 1)
+local allowed = 0
+local retry_after = 0
+if cost < 0 then
+    allowed = 1
+    tokens = math.min(capacity, tokens - cost)
+elseif tokens >= need then
+    allowed = 1
+    tokens = tokens - cost
+else
+    retry_after = math.ceil((need - tokens) / rate)
+end
+redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1000)
+return {allowed, math.floor(tokens), retry_after}
+"""
+
+_script = None
+
+
+def bucket_key(name, key):
+    return 'rate_limit_%s_%s' % (name, key)
+
+
+def get_limit(name, capacity, period):
+    """配置 RATE_LIMITS 中有同名限制时使用配置，如 {'image_codes_ip': (30, 60)}"""
+    return current_app.config.get('RATE_LIMITS', {}).get(name, (capacity, period))
+
+
+def consume(name, key, capacity, period, cost=1):
+    """从桶中取 cost 个令牌
+
+    :param name: 限制的名称，不同接口、不同维度使用不同名称
+    :param key: 限制的对象，如IP、手机号、用户ID
+    :param capacity: 桶的容量，即 period 秒内最多允许的次数
+    :param period: 补满桶的时间，单位秒
+    :param cost: 消耗的令牌数，为 0 时只检查不消耗，为负数时退还
+    :return: (是否放行, 需要等待的秒数)
+    """
+    global _script
+    if not current_app.config.get('RATE_LIMIT_ENABLED', True):
+        return True, 0
+    capacity, period = get_limit(name, capacity, period)
+    if _script is None:
+        _script = redis_store.register_script(TOKEN_BUCKET_SCRIPT)
+    try:
+        allowed, _, retry_after = _script(keys=[bucket_key(name, key)],
+                                          args=[capacity, float(capacity) / (period * 1000),
+                                                int(time.time() * 1000), cost],
+                                          client=redis_store)
+    except Exception as e:
+        current_app.logger.error(e)
+        return True, 0
+    return bool(allowed), (retry_after + 999) // 1000
+
+
+def refund(name, key, capacity, period, cost=1):
+    """退还 consume 取出的令牌，取令牌后操作没有完成时调用，参数与 consume 相同"""
+    return consume(name, key, capacity, period, -cost)
+
+
+def by_ip():
+    return request.remote_addr
+
+
+def limited_response(retry_after):
+    resp = jsonify(errno=RET.REQERR, errmsg='请求过于频繁，请稍后重试')
+    resp.headers['Retry-After'] = str(retry_after)
+    return resp
+
+
+def rate_limit(name, key_func, capacity, period, cost=1):
+    """限流装饰器，放在 route 装饰器下面
+
+    @api.route('/image_codes/<image_code_id>')
+    @rate_limit('image_codes_ip', by_ip, 30, 60)
+
+    :param key_func: 返回限制对象的函数，返回 None 时不限制
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(*args, **kwargs):
+            key = key_func()
+            if key is not None:
+                allowed, retry_after = consume(name, key, capacity, period, cost)
+                if not allowed:
+                    return limited_response(retry_after)
+            return view_func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
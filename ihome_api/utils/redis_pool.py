@@ -0,0 +1,124 @@
+# coding:utf-8
+"""redis 连接池
+
+flask-session 和 redis_store 共用一个连接池，连接数有上限，连接用完时等待空闲连接而不是无限创建；
+连接池记录创建的连接数、正在使用的连接数和获取连接的耗时，各进程定期写入redis，用于按进程评估连接池的大小。
+"""
+import os
+import json
+import socket
+import threading
+import time
+import logging
+import redis
+
+# 各进程连接池统计数据的哈希，字段为 主机名:进程号
+STATS_KEY = 'redis_pool_stats'
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """记录使用情况的阻塞连接池"""
+
+    def reset(self):
+        super(InstrumentedConnectionPool, self).reset()
+        # fork 之后子进程会重新调用 reset，统计数据从零开始
+        self._stats_lock = threading.Lock()
+        self.created = 0  # 创建的连接数
+        self.in_use = 0  # 正在使用的连接数
+        self.max_in_use = 0  # 同时使用的最大连接数
+        self.acquired = 0  # 获取连接的次数
+        self.errors = 0  # 获取连接失败的次数，包括等待超时和连接失败
+        self.wait_time = 0.0  # 获取连接的总耗时，包括等待空闲连接和建立连接
+        self.max_wait_time = 0.0  # 获取连接的最大耗时
+
+    def make_connection(self):
+        connection = super(InstrumentedConnectionPool, self).make_connection()
+        with self._stats_lock:
+            self.created += 1
+        return connection
+
+    def get_connection(self, command_name, *keys, **options):
+        start = time.time()
+        try:
+            connection = super(InstrumentedConnectionPool, self).get_connection(command_name, *keys, **options)
+        except Exception:
+            with self._stats_lock:
+                self.errors += 1
+            raise
+        waited = time.time() - start
+        with self._stats_lock:
+            self.acquired += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+        return connection
+
+    def release(self, connection):
+        super(InstrumentedConnectionPool, self).release(connection)
+        if connection.pid == self.pid:
+            with self._stats_lock:
+                self.in_use -= 1
+
+    def stats(self):
+        """当前进程的连接池统计数据，耗时单位为毫秒"""
+        with self._stats_lock:
+            return {
+                'pid': self.pid,
+                'max_connections': self.max_connections,
+                'created': self.created,
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'acquired': self.acquired,
+                'errors': self.errors,
+                'wait_ms_avg': round(self.wait_time * 1000 / self.acquired, 3) if self.acquired else 0,
+                'wait_ms_max': round(self.max_wait_time * 1000, 3),
+            }
+
+
+def create_pool(config, **kwargs):
+    """根据配置创建连接池
+
+    :param config: flask 的配置，使用 REDIS_ 开头的配置项
+    :param kwargs: 传给连接的其他参数
+    """
+    return InstrumentedConnectionPool(
+        host=config['REDIS_HOST'],
+        port=config['REDIS_PORT'],
+        db=config.get('REDIS_DB', 0),
+        max_connections=config['REDIS_MAX_CONNECTIONS'],
+        timeout=config['REDIS_POOL_TIMEOUT'],
+        socket_timeout=config['REDIS_SOCKET_TIMEOUT'],
+        socket_connect_timeout=config['REDIS_SOCKET_CONNECT_TIMEOUT'],
+        health_check_interval=config['REDIS_HEALTH_CHECK_INTERVAL'],
+        **kwargs)
+
+
+_reported_at = [0]
+_report_lock = threading.Lock()
+
+
+def report_stats(client, interval, expires):
+    """每隔 interval 秒将当前进程的连接池统计数据写入redis"""
+    now = time.time()
+    if now - _reported_at[0] < interval:
+        return
+    with _report_lock:
+        if now - _reported_at[0] < interval:
+            return
+        _reported_at[0] = now
+    stats = client.connection_pool.stats()
+    stats['time'] = int(now)
+    try:
+        pipeline = client.pipeline()
+        pipeline.hset(STATS_KEY, '%s:%s' % (socket.gethostname(), os.getpid()), json.dumps(stats))
+        pipeline.expire(STATS_KEY, expires)
+        pipeline.execute()
+    except Exception as e:
+        logging.error(e)
+
+
+def all_stats(client):
+    """读取所有进程最近写入的统计数据，返回 {主机名:进程号: 统计数据}"""
+    return dict((field.decode('utf-8'), json.loads(value.decode('utf-8')))
+                for field, value in client.hgetall(STATS_KEY).items())
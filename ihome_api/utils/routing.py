@@ -0,0 +1,91 @@
+# coding:utf-8
+"""数据库读写分离
+
+配置了 SQLALCHEMY_BINDS['replica'] 时，标记为只读的视图中的查询发送到只读副本，
+其他查询、所有写操作、SELECT ... FOR UPDATE 以及本次请求中已有写操作之后的查询都使用主库。
+用户写入数据后的一段时间内，该用户的只读请求也使用主库，避免副本同步延迟导致读不到刚写入的数据。
+"""
+import time
+from functools import wraps
+from flask import g, session, current_app, has_app_context, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+from ihome_api import contants
+
+# 只读副本在 SQLALCHEMY_BINDS 中的名字
+REPLICA_BIND = 'replica'
+# 用户在该时间之前的请求都使用主库，保存在session中
+PRIMARY_UNTIL_KEY = 'db_primary_until'
+
+
+def replica_configured(app):
+    return REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+def on_replica():
+    """当前请求中的查询是否发送到只读副本"""
+    return (has_app_context() and g.get('db_read_only', False) and not g.get('db_use_primary', False)
+            and replica_configured(current_app))
+
+
+def use_primary():
+    """本次请求剩下的查询都使用主库"""
+    g.db_use_primary = True
+
+
+def read_only(view_func):
+    """只读视图的装饰器，视图中的查询使用只读副本"""
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        if session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+            # 用户刚写入过数据，继续使用主库
+            use_primary()
+        return view_func(*args, **kwargs)
+
+    return wrapper
+
+
+class RoutingSession(SignallingSession):
+    """根据查询类型和请求标记选择主库或只读副本的session"""
+
+    def __init__(self, db, **options):
+        super(RoutingSession, self).__init__(db, **options)
+        self.db = db
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None):
+        if isinstance(clause, UpdateBase):
+            # query.update()/delete() 等批量写操作不经过 flush，在选择连接时记录
+            self._wrote = True
+        if self._use_replica(clause):
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+    def _use_replica(self, clause):
+        if self._flushing or self._wrote:
+            return False
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return False
+        if not has_app_context() or not g.get('db_read_only', False) or g.get('db_use_primary', False):
+            return False
+        return replica_configured(self.app)
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            self._wrote = True
+        super(RoutingSession, self).flush(objects)
+
+    def commit(self):
+        super(RoutingSession, self).commit()
+        if self._wrote and has_request_context() and replica_configured(self.app):
+            session[PRIMARY_UNTIL_KEY] = int(time.time()) + contants.DB_PRIMARY_STICKY_SECONDS
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """使用 RoutingSession 的 SQLAlchemy"""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -0,0 +1,120 @@
+# coding:utf-8
+"""接口响应的json序列化
+
+安装了 orjson 时使用 orjson，否则使用标准库 json，两种实现输出完全相同的字节：
+按键排序、紧凑的分隔符、中文不转义。
+
+两者格式化部分浮点数的方式不同（如 1e-05 和 0.00001、1e+16 和 1e16），orjson 也不支持超过64位的整数和
+非字符串的键；另一方面 orjson 能直接序列化日期、UUID、枚举、dataclass 等标准库 json 不支持的类型，
+并把 NaN 和 Infinity 输出为 null。数据中有这些值时 orjson 实现改用标准库 json，输出相同或抛出相同的 TypeError。
+接口数据中金额、数量都是整数，日期已格式化为字符串，一般不会触发。
+"""
+import json
+import math
+import re
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+# 两者对浮点数都输出能还原出原值的最短数字，只在科学计数法和很小的数上格式不同，
+# 这时 orjson 的输出中一定有数字后跟指数（如 1e16、1e-7）或者 0.0000（如 0.00001）
+_EXPONENT_RE = re.compile(rb'e[-0-9]')
+
+
+def _has_float_mismatch(data):
+    """orjson 的输出中是否可能有与标准库格式不同的浮点数，字符串中碰巧出现时只是多一次序列化"""
+    if b'0.0000' in data:
+        return True
+    for match in _EXPONENT_RE.finditer(data):
+        if data[match.start() - 1:match.start()].isdigit():
+            return True
+    return False
+
+
+# 两者输出相同的类型，浮点数还需要是有限值
+_SCALARS = frozenset((str, int, bool, type(None)))
+
+
+def _is_plain(obj):
+    """数据是否只由 dict、list、tuple、字符串、整数、布尔值、None 和有限的浮点数组成，子类也不算"""
+    stack = [obj]
+    while stack:
+        value = stack.pop()
+        value_type = type(value)
+        if value_type is dict:
+            values = value.values()
+        elif value_type is list or value_type is tuple:
+            values = value
+        elif value_type is float:
+            if not math.isfinite(value):
+                return False
+            continue
+        elif value_type in _SCALARS:
+            continue
+        else:
+            return False
+        # 大部分容器中只有字符串和整数，整体检查类型比逐个判断快
+        if not _SCALARS.issuperset(map(type, values)):
+            stack.extend(values)
+    return True
+
+
+def _orjson_default(obj):
+    raise TypeError('Object of type %s is not JSON serializable' % type(obj).__name__)
+
+
+# 日期和 dataclass 交给 default，不由 orjson 直接序列化
+_ORJSON_OPTIONS = 0
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+def _orjson_dumps(obj):
+    # UUID、枚举和非有限的浮点数不能通过选项关闭，先检查数据
+    if not _is_plain(obj):
+        return _json_dumps(obj)
+    try:
+        data = orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        # 超过64位的整数、非字符串的键等，由标准库处理或抛出相同的异常
+        return _json_dumps(obj)
+    if _has_float_mismatch(data):
+        return _json_dumps(obj)
+    return data.decode('utf-8')
+
+
+# 可用的序列化实现
+BACKENDS = {'json': _json_dumps}
+if orjson is not None:
+    BACKENDS['orjson'] = _orjson_dumps
+
+_backend = ['orjson' if orjson is not None else 'json']
+
+
+def get_backend():
+    return _backend[0]
+
+
+def set_backend(name):
+    """切换序列化实现，name 为 BACKENDS 中的名字"""
+    if name not in BACKENDS:
+        raise ValueError('unknown json backend: %s' % name)
+    _backend[0] = name
+
+
+def dumps(obj):
+    """将数据序列化为json字符串"""
+    return BACKENDS[_backend[0]](obj)
+
+
+def jsonify(**kwargs):
+    """与 flask.jsonify 用法相同，使用当前的序列化实现"""
+    return current_app.response_class(dumps(kwargs), mimetype='application/json')
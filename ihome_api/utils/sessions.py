@@ -0,0 +1,61 @@
+# coding:utf-8
+"""签名cookie会话
+
+SESSION_MODE 为 'cookie' 时，会话数据（user_id、name、mobile 等）经过签名后直接保存在cookie中，
+带有签发时间，超过 PERMANENT_SESSION_LIFETIME 后失效，验证登录状态不需要查询redis。
+cookie 只签名不加密，不能在会话中保存不希望用户看到的数据。
+退出登录时把会话编号加入redis中的吊销列表，SESSION_REVOCATION 为 True 时每个请求检查一次。
+"""
+import uuid
+import logging
+from flask import current_app
+from flask.sessions import SecureCookieSessionInterface
+
+# 会话编号，签发cookie时生成，用于吊销
+SID_KEY = 'sid'
+
+
+def revoked_key(sid):
+    return 'session_revoked_%s' % sid
+
+
+def _is_revoked(sid):
+    from ihome_api import redis_store
+    try:
+        return bool(redis_store.exists(revoked_key(sid)))
+    except Exception as e:
+        # 无法确认时按已吊销处理，与redis会话模式下redis不可用时的表现一致
+        logging.error(e)
+        return True
+
+
+class SignedCookieSessionInterface(SecureCookieSessionInterface):
+    """会话数据保存在签名cookie中，支持吊销"""
+
+    def open_session(self, app, request):
+        session = super(SignedCookieSessionInterface, self).open_session(app, request)
+        if session is not None and session.get(SID_KEY) and app.config.get('SESSION_REVOCATION') \
+                and _is_revoked(session[SID_KEY]):
+            return self.session_class()
+        return session
+
+    def save_session(self, app, session, response):
+        if 'user_id' in session and SID_KEY not in session:
+            session[SID_KEY] = uuid.uuid4().hex
+        super(SignedCookieSessionInterface, self).save_session(app, session, response)
+
+
+def init_app(app):
+    """SESSION_MODE 为 'cookie' 时替换 flask-session 的会话实现"""
+    if app.config.get('SESSION_MODE') == 'cookie':
+        app.session_interface = SignedCookieSessionInterface()
+
+
+def revoke(session):
+    """退出登录时吊销签名cookie会话，cookie 有效期内再次使用会被当作未登录"""
+    sid = session.get(SID_KEY)
+    if not sid or current_app.config.get('SESSION_MODE') != 'cookie' or not current_app.config.get(
+            'SESSION_REVOCATION'):
+        return
+    from ihome_api import redis_store
+    redis_store.setex(revoked_key(sid), int(current_app.permanent_session_lifetime.total_seconds()), 1)
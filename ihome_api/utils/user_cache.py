@@ -0,0 +1,55 @@
+# coding:utf-8
+"""用户资料缓存
+
+用户资料（基本信息和实名信息）以json保存在redis中，资料很少变化，
+个人中心的只读接口直接读取缓存，修改用户名、头像、实名信息后删除缓存。
+"""
+import json
+from flask import current_app
+from ihome_api import redis_store, contants
+from ihome_api.models import User
+from ihome_api.utils import serializer
+
+# User.to_dict 和 User.auth_to_dict 的字段
+BASIC_FIELDS = ('user_id', 'name', 'mobile', 'avatar', 'create_time')
+AUTH_FIELDS = ('user_id', 'real_name', 'id_card')
+
+
+def profile_key(user_id):
+    return 'user_profile_%s' % user_id
+
+
+def load_profile(user_id):
+    """读取用户资料，缓存中没有时查询数据库并写入缓存，用户不存在时返回 None"""
+    try:
+        cached = redis_store.get(profile_key(user_id))
+    except Exception as e:
+        current_app.logger.error(e)
+        cached = None
+    if cached is not None:
+        return json.loads(cached.decode('utf-8'))
+    user = User.query.get(user_id)
+    if user is None:
+        return None
+    profile = user.to_dict()
+    profile.update(user.auth_to_dict())
+    try:
+        redis_store.setex(profile_key(user_id), contants.USER_PROFILE_REDIS_EXPIRES, serializer.dumps(profile))
+    except Exception as e:
+        current_app.logger.error(e)
+    return profile
+
+
+def invalidate_profile(user_id):
+    """用户资料变化后删除缓存"""
+    redis_store.delete(profile_key(user_id))
+
+
+def basic_dict(profile):
+    """与 User.to_dict 相同的数据"""
+    return dict((field, profile[field]) for field in BASIC_FIELDS)
+
+
+def auth_dict(profile):
+    """与 User.auth_to_dict 相同的数据"""
+    return dict((field, profile[field]) for field in AUTH_FIELDS)
@@ -0,0 +1,57 @@
+"""booking index, monthly stats and composite indexes for the search and booking hot paths
+
+Revision ID: 3f2a9c1d7b4e
+Revises: 0b6e2d8a41c5
+Create Date: 2026-10-18 19:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b4e'
+down_revision = '0b6e2d8a41c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ih_house_booked_day',
+    sa.Column('house_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['house_id'], ['ih_house_info.id'], ),
+    sa.ForeignKeyConstraint(['order_id'], ['ih_order_info.id'], ),
+    sa.PrimaryKeyConstraint('house_id', 'day')
+    )
+    op.create_index('ix_house_booked_day_day_house', 'ih_house_booked_day', ['day', 'house_id'], unique=False)
+    op.create_index(op.f('ix_ih_house_booked_day_order_id'), 'ih_house_booked_day', ['order_id'], unique=False)
+    op.create_table('ih_house_month_stat',
+    sa.Column('house_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('booking_count', sa.Integer(), nullable=False),
+    sa.Column('accept_count', sa.Integer(), nullable=False),
+    sa.Column('complete_count', sa.Integer(), nullable=False),
+    sa.Column('booked_days', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['house_id'], ['ih_house_info.id'], ),
+    sa.PrimaryKeyConstraint('house_id', 'month')
+    )
+    op.create_index('ix_house_area_create_time', 'ih_house_info', ['area_id', 'create_time'], unique=False)
+    op.create_index('ix_house_area_order_count', 'ih_house_info', ['area_id', 'order_count'], unique=False)
+    op.create_index('ix_house_area_price', 'ih_house_info', ['area_id', 'price'], unique=False)
+    op.create_index('ix_order_house_create_time', 'ih_order_info', ['house_id', 'create_time'], unique=False)
+    op.create_index('ix_order_house_dates', 'ih_order_info', ['house_id', 'begin_date', 'end_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_order_house_dates', table_name='ih_order_info')
+    op.drop_index('ix_order_house_create_time', table_name='ih_order_info')
+    op.drop_index('ix_house_area_price', table_name='ih_house_info')
+    op.drop_index('ix_house_area_order_count', table_name='ih_house_info')
+    op.drop_index('ix_house_area_create_time', table_name='ih_house_info')
+    op.drop_table('ih_house_month_stat')
+    op.drop_index(op.f('ix_ih_house_booked_day_order_id'), table_name='ih_house_booked_day')
+    op.drop_index('ix_house_booked_day_day_house', table_name='ih_house_booked_day')
+    op.drop_table('ih_house_booked_day')
@@ -0,0 +1,110 @@
+# coding:utf-8
+"""测试使用本地redis的第15号库和临时目录中的sqlite数据库，没有可用的redis时跳过需要应用的测试
+
+ihome_api.utils 中的部分模块在导入时引用 ihome_api.redis_store，需要在测试函数中、应用创建之后导入。
+"""
+import datetime
+import pytest
+import redis
+import config
+
+REDIS_TEST_DB = 15
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """整个测试过程只创建一个应用，各模块在导入时引用了 ihome_api.redis_store"""
+    try:
+        redis.StrictRedis(host=config.Config.REDIS_HOST, port=config.Config.REDIS_PORT, db=REDIS_TEST_DB,
+                          socket_connect_timeout=1).ping()
+    except redis.ConnectionError:
+        pytest.skip('需要本地的redis')
+
+    class TestingConfig(config.Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        REDIS_DB = REDIS_TEST_DB
+        RATE_LIMIT_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///%s' % tmp_path_factory.mktemp('db').joinpath('ihome.db')
+        # 并发写入时等待sqlite的写锁，而不是直接报 database is locked
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+
+    config.config_map['testing'] = TestingConfig
+    from ihome_api import create_app
+    return create_app('testing')
+
+
+@pytest.fixture
+def db(app):
+    """每个测试使用空的数据库和redis
+
+    测试中不保留应用上下文，测试客户端的每个请求使用自己的上下文（g 对象和数据库session），与实际运行时一致，
+    直接访问数据库时需要 with app.app_context()。
+    """
+    from ihome_api import db, redis_store
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    redis_store.flushdb()
+    return db
+
+
+def _detach(db, objs):
+    """加载对象的字段后从session中移除，离开应用上下文后仍可读取"""
+    for obj in objs:
+        db.session.refresh(obj)
+    db.session.expunge_all()
+    return objs
+
+
+@pytest.fixture
+def login():
+    """直接在会话中写入登录状态，不经过密码校验"""
+    def login(client, user_id):
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['name'] = 'user%s' % user_id
+            sess['mobile'] = '138%08d' % user_id
+    return login
+
+
+@pytest.fixture
+def make_users(app, db):
+    """创建用户的函数，返回创建的用户列表"""
+    from ihome_api.models import User
+
+    def make_users(count):
+        with app.app_context():
+            start = db.session.query(User).count()
+            users = [User(name='user%s' % i, mobile='139%08d' % i, password_hash='-')
+                     for i in range(start, start + count)]
+            db.session.add_all(users)
+            db.session.commit()
+            return _detach(db, users)
+    return make_users
+
+
+@pytest.fixture
+def make_houses(app, db):
+    """创建房屋的函数，房屋依次属于 owners 中的用户和三个城区，返回创建的房屋列表"""
+    from ihome_api.models import Area, Facility, House
+    with app.app_context():
+        for area_id in range(1, 4):
+            db.session.add(Area(id=area_id, name='城区%s' % area_id))
+        for facility_id in range(1, 6):
+            db.session.add(Facility(id=facility_id, name='设施%s' % facility_id))
+        db.session.commit()
+
+    def make_houses(count, owners):
+        with app.app_context():
+            start = db.session.query(House).count()
+            houses = []
+            for i in range(start, start + count):
+                houses.append(House(user_id=owners[i % len(owners)].id, area_id=i % 3 + 1, title='阳光小屋%s' % i,
+                                    price=100 * (i + 1), address='北京市朝阳区%s号' % i,
+                                    index_image_url='house%s.jpg' % i,
+                                    create_time=datetime.datetime(2020, 1, 1) + datetime.timedelta(days=i)))
+            db.session.add_all(houses)
+            db.session.commit()
+            return _detach(db, houses)
+    return make_houses
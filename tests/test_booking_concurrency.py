@@ -0,0 +1,96 @@
+# coding:utf-8
+"""并发预订：多个线程同时预订重叠的日期，每个 (房屋, 日期) 只能被一个订单占用"""
+import datetime
+import queue
+import random
+import threading
+import time
+from ihome_api.models import Order, HouseBookedDay
+from ihome_api.utils.response_code import RET
+
+THREADS = 20
+FIRST_DAY = datetime.date(2026, 11, 1)
+
+
+def _day(offset):
+    return (FIRST_DAY + datetime.timedelta(days=offset)).strftime('%Y-%m-%d')
+
+
+def _run(app, login, guests, bookings):
+    """由 THREADS 个线程发出预订请求，每个线程使用一个已登录的房客，返回 [(预订参数, 结果)]"""
+    tasks = queue.Queue()
+    for booking in bookings:
+        tasks.put(booking)
+    results = []
+    lock = threading.Lock()
+
+    def worker(guest_id):
+        client = app.test_client()
+        login(client, guest_id)
+        while True:
+            try:
+                booking = tasks.get_nowait()
+            except queue.Empty:
+                return
+            house_id, begin, end = booking
+            resp = client.post('/api/v1.0/orders', json={
+                'house_id': house_id, 'start_date': _day(begin), 'end_date': _day(end)}).get_json()
+            with lock:
+                results.append((booking, resp))
+
+    threads = [threading.Thread(target=worker, args=(guest.id,)) for guest in guests[:THREADS]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_overlapping_bookings(app, db, login, make_users, make_houses):
+    from ihome_api.utils import availability
+    owner, *guests = make_users(THREADS + 1)
+    houses = make_houses(4, [owner])
+    # 索引就绪后按索引判断冲突，并发时由索引表的主键保证同一天只有一个订单
+    with app.app_context():
+        availability.rebuild_index()
+
+    random.seed(12)
+    # 同一个时段的相同请求，每个时段只能有一个成功
+    slots = [(house.id, day, day + 1) for house in houses for day in range(0, 10, 2)]
+    bookings = [slot for slot in slots for _ in range(10)]
+    # 随机的重叠时段
+    for _ in range(200):
+        begin = random.randint(10, 30)
+        bookings.append((random.choice(houses).id, begin, begin + random.randint(0, 3)))
+    random.shuffle(bookings)
+
+    start = time.time()
+    results = _run(app, login, guests, bookings)
+    seconds = time.time() - start
+    print('\n%d booking requests from %d threads in %.2fs: %.1f requests/s, %d booked' % (
+        len(results), THREADS, seconds, len(results) / seconds,
+        len([resp for _, resp in results if resp['errno'] == RET.OK])))
+
+    assert len(results) == len(bookings)
+    # 失败的请求都是因为日期已被预订，不是数据库错误
+    assert set(resp['errno'] for _, resp in results) <= {RET.OK, RET.DATAEXIST}
+    for slot in slots:
+        assert len([1 for booking, resp in results if booking == slot and resp['errno'] == RET.OK]) == 1
+
+    with app.app_context():
+        orders = Order.query.all()
+        booked = {}
+        for order in orders:
+            for day in availability.iter_days(order.begin_date, order.end_date):
+                # 没有两个订单占用同一个房屋的同一天
+                assert (order.house_id, day) not in booked
+                booked[(order.house_id, day)] = order.id
+        # 索引与订单一致
+        assert dict(((row.house_id, row.day), row.order_id) for row in HouseBookedDay.query) == booked
+    assert len(orders) == len([1 for _, resp in results if resp['errno'] == RET.OK])
+    # 被拒绝的请求确实与某个成功的订单冲突
+    for (house_id, begin, end), resp in results:
+        if resp['errno'] == RET.DATAEXIST:
+            days = availability.iter_days(FIRST_DAY + datetime.timedelta(days=begin),
+                                          FIRST_DAY + datetime.timedelta(days=end))
+            assert any((house_id, day) in booked for day in days)
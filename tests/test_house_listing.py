@@ -0,0 +1,77 @@
+# coding:utf-8
+"""从有序集合读取的房屋列表页：有序集合的版本未变化时直接返回304，不读取房屋数据；页数的处理与数据库查询一致"""
+import pytest
+from ihome_api.models import House
+
+URL = '/api/v1.0/houses?p=1&sk=price-inc'
+
+
+def test_house_list_etag(app, db, make_users, make_houses, monkeypatch):
+    from ihome_api.utils import house_listing
+    owners = make_users(2)
+    houses = make_houses(6, owners)
+    with app.app_context():
+        house_listing.rebuild()
+    reads = []
+    cards = house_listing._cards
+
+    def count_cards(members):
+        reads.append(members)
+        return cards(members)
+
+    monkeypatch.setattr(house_listing, '_cards', count_cards)
+    client = app.test_client()
+
+    resp = client.get(URL)
+    assert resp.status_code == 200 and len(reads) == 1
+    etag = resp.headers['ETag']
+    resp = client.get(URL, headers={'If-None-Match': etag})
+    assert resp.status_code == 304 and resp.headers['ETag'] == etag
+    assert len(reads) == 1
+    # 其他排序方向、页码、城区的ETag不同
+    for url in ('/api/v1.0/houses?p=1&sk=price-des', '/api/v1.0/houses?p=2&sk=price-inc',
+                '/api/v1.0/houses?p=1&sk=price-inc&aid=1'):
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+    other_area = client.get('/api/v1.0/houses?p=1&aid=2').headers['ETag']
+
+    # 房屋数据变化后，所在的全部城区和本城区的列表页ETag变化，其他城区不变
+    with app.app_context():
+        house = House.query.get(houses[0].id)
+        house.title = 'changed'
+        db.session.commit()
+        house_listing.index_house(house)
+    resp = client.get(URL, headers={'If-None-Match': etag})
+    assert resp.status_code == 200 and resp.headers['ETag'] != etag
+    assert 'changed' in resp.get_data(as_text=True)
+    resp = client.get('/api/v1.0/houses?p=1&aid=2', headers={'If-None-Match': other_area})
+    assert resp.status_code == 304
+
+
+def test_house_list_etag_changes_after_rebuild(app, db, make_users, make_houses):
+    """重建后版本号重新生成，客户端的旧ETag失效"""
+    from ihome_api.utils import house_listing
+    make_houses(3, make_users(1))
+    with app.app_context():
+        house_listing.rebuild()
+    client = app.test_client()
+    etag = client.get(URL).headers['ETag']
+    with app.app_context():
+        house_listing.rebuild()
+    assert client.get(URL, headers={'If-None-Match': etag}).status_code == 200
+
+
+@pytest.mark.parametrize('ready', [True, False])
+@pytest.mark.parametrize('page', ['0', '-1', 'x'])
+def test_house_list_page_below_one(app, db, make_users, make_houses, ready, page):
+    """页数小于1时返回第一页，有序集合和数据库查询的结果相同"""
+    from ihome_api.utils import house_listing
+    make_houses(6, make_users(1))
+    if ready:
+        with app.app_context():
+            house_listing.rebuild()
+    client = app.test_client()
+    first = client.get('/api/v1.0/houses?p=1&sk=price-inc').get_json()
+    resp = client.get('/api/v1.0/houses?p=%s&sk=price-inc' % page).get_json()
+    assert resp['data']['current_page'] == 1
+    assert resp['data']['houses'] == first['data']['houses']
+    assert [house['price'] for house in resp['data']['houses']] == [100, 200]
@@ -0,0 +1,33 @@
+# coding:utf-8
+"""接单、拒单接口的参数校验：格式错误的请求返回参数错误，而不是服务器错误"""
+import pytest
+from ihome_api.utils.response_code import RET
+
+
+@pytest.mark.parametrize('body', [
+    [1],
+    'accept',
+    {'orders': {'order_id': 1, 'action': 'accept'}},
+    {'orders': [1]},
+    {'order_ids': 1, 'action': 'accept'},
+    {'order_ids': {'1': 1}, 'action': 'accept'},
+    {'order_ids': [1], 'action': ['accept']},
+    {'order_ids': [1], 'action': 'reject', 'reason': ['busy']},
+])
+def test_bulk_order_actions_bad_body(app, db, login, make_users, body):
+    landlord, = make_users(1)
+    client = app.test_client()
+    login(client, landlord.id)
+    resp = client.put('/api/v1.0/orders/status', json=body)
+    assert resp.status_code == 200
+    assert resp.get_json()['errno'] == RET.PARAMERR
+
+
+@pytest.mark.parametrize('body', [[1], 'accept', {'action': ['accept']}])
+def test_order_action_bad_body(app, db, login, make_users, body):
+    landlord, = make_users(1)
+    client = app.test_client()
+    login(client, landlord.id)
+    resp = client.put('/api/v1.0/orders/1/status', json=body)
+    assert resp.status_code == 200
+    assert resp.get_json()['errno'] == RET.PARAMERR
@@ -0,0 +1,40 @@
+# coding:utf-8
+"""房屋月度统计：并发的事务先插入了同一个月的记录时，下单不受影响"""
+import datetime
+from ihome_api.models import HouseMonthStat
+from ihome_api.utils.response_code import RET
+from ihome_api.utils.routing import RoutingSession
+
+
+def test_concurrent_first_booking_of_month(app, db, login, make_users, make_houses, monkeypatch):
+    landlord, first, second = make_users(3)
+    house, = make_houses(1, [landlord])
+    client = app.test_client()
+    login(client, first.id)
+    resp = client.post('/api/v1.0/orders', json={
+        'house_id': house.id, 'start_date': '2026-11-01', 'end_date': '2026-11-02'}).get_json()
+    assert resp['errno'] == RET.OK, resp
+
+    # 第二个订单的第一次更新不执行，相当于另一个事务在更新之后、插入之前提交了同一个月的记录
+    execute = RoutingSession.execute
+    skipped = []
+
+    class NoRows(object):
+        rowcount = 0
+
+    def skip_first_update(session, clause, *args, **kwargs):
+        if not skipped and str(clause).startswith('UPDATE ih_house_month_stat'):
+            skipped.append(clause)
+            return NoRows()
+        return execute(session, clause, *args, **kwargs)
+
+    monkeypatch.setattr(RoutingSession, 'execute', skip_first_update)
+    client = app.test_client()
+    login(client, second.id)
+    resp = client.post('/api/v1.0/orders', json={
+        'house_id': house.id, 'start_date': '2026-11-05', 'end_date': '2026-11-05'}).get_json()
+    assert skipped
+    assert resp['errno'] == RET.OK, resp
+    with app.app_context():
+        stat = HouseMonthStat.query.get((house.id, datetime.date(2026, 11, 1)))
+        assert stat.booking_count == 2
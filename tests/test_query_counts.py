@@ -0,0 +1,97 @@
+# coding:utf-8
+"""列表接口的查询次数不随每页的数据量增加，防止序列化时逐条懒加载关联对象（N+1 查询）"""
+import contextlib
+import datetime
+import pytest
+from sqlalchemy import event
+from ihome_api import contants
+from ihome_api.models import Order
+
+SIZES = (2, 5, 10)
+
+
+@contextlib.contextmanager
+def count_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def _get(app, db, url, login=None, user_id=None):
+    """清空redis中的页面和用户资料缓存后请求一次，返回 (响应数据, 执行的语句数)"""
+    from ihome_api import redis_store
+    redis_store.flushdb()
+    client = app.test_client()
+    if login is not None:
+        login(client, user_id)
+    with count_queries(db.get_engine(app)) as statements:
+        resp = client.get(url).get_json()
+    assert resp['errno'] == '0', resp
+    return resp, len(statements)
+
+
+@pytest.mark.parametrize('url', ['/api/v1.0/houses?p=1', '/api/v1.0/houses?cursor=', '/api/v1.0/houses?sk=booking'])
+def test_house_list_query_count(app, db, make_users, make_houses, monkeypatch, url):
+    owners = make_users(10)
+    make_houses(12, owners)
+    counts = []
+    for size in SIZES:
+        monkeypatch.setattr(contants, 'HOUSE_LIST_PAGE_CAPACITY', size)
+        resp, count = _get(app, db, url)
+        assert len(resp['data']['houses']) == size
+        counts.append(count)
+    assert len(set(counts)) == 1, counts
+
+
+def test_user_houses_query_count(app, db, login, make_users, make_houses):
+    owners = make_users(len(SIZES))
+    counts = []
+    for owner, size in zip(owners, SIZES):
+        make_houses(size, [owner])
+        resp, count = _get(app, db, '/api/v1.0/user/houses', login, owner.id)
+        assert len(resp['data']['houses']) == size
+        counts.append(count)
+    assert len(set(counts)) == 1, counts
+
+
+def _make_orders(app, db, guest, houses):
+    with app.app_context():
+        for i, house in enumerate(houses):
+            begin = datetime.datetime(2026, 11, 1) + datetime.timedelta(days=i)
+            db.session.add(Order(house_id=house.id, user_id=guest.id, begin_date=begin, end_date=begin, days=1,
+                                 house_price=house.price, amount=house.price))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('role', ['custom', 'landlord'])
+def test_user_orders_query_count(app, db, login, make_users, make_houses, role):
+    users = make_users(len(SIZES) * 2)
+    counts = []
+    for i, size in enumerate(SIZES):
+        guest, landlord = users[2 * i], users[2 * i + 1]
+        # 每个订单对应不同的房屋
+        _make_orders(app, db, guest, make_houses(size, [landlord]))
+        user_id = landlord.id if role == 'landlord' else guest.id
+        resp, count = _get(app, db, '/api/v1.0/user/orders?role=%s' % role, login, user_id)
+        assert len(resp['data']['orders']) == size
+        counts.append(count)
+    assert len(set(counts)) == 1, counts
+
+
+def test_user_orders_cursor_query_count(app, db, login, make_users, make_houses, monkeypatch):
+    guest, landlord = make_users(2)
+    _make_orders(app, db, guest, make_houses(12, [landlord]))
+    counts = []
+    for size in SIZES:
+        monkeypatch.setattr(contants, 'ORDER_LIST_PAGE_CAPACITY', size)
+        resp, count = _get(app, db, '/api/v1.0/user/orders?cursor=', login, guest.id)
+        assert len(resp['data']['orders']) == size
+        counts.append(count)
+    assert len(set(counts)) == 1, counts
@@ -0,0 +1,147 @@
+# coding:utf-8
+"""读写分离：主库和只读副本是两个sqlite文件，按各自执行的语句判断查询发送到了哪个库"""
+import datetime
+import time
+import pytest
+from flask import g
+from sqlalchemy import event
+from ihome_api import contants
+from ihome_api.models import House, Order, User
+
+
+class StatementLog(object):
+    """记录一个数据库执行的语句"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', self._log)
+
+    def _log(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def take(self):
+        """返回并清空已记录的语句"""
+        statements, self.statements = self.statements, []
+        return statements
+
+    def close(self):
+        event.remove(self.engine, 'before_cursor_execute', self._log)
+
+
+@pytest.fixture
+def dbs(app, db, order, tmp_path):
+    """在准备好数据后配置只读副本，副本中只有表结构没有数据，返回 (主库的语句记录, 副本的语句记录)"""
+    app.config['SQLALCHEMY_BINDS'] = {'replica': 'sqlite:///%s' % tmp_path.joinpath('replica.db')}
+    replica = db.get_engine(app, bind='replica')
+    db.Model.metadata.create_all(bind=replica)
+    primary_log, replica_log = StatementLog(db.get_engine(app)), StatementLog(replica)
+    yield primary_log, replica_log
+    primary_log.close()
+    replica_log.close()
+    app.config['SQLALCHEMY_BINDS'] = {}
+    replica.dispose()
+
+
+@pytest.fixture
+def order(app, db, make_users, make_houses):
+    """主库中的一个订单，返回 (房客编号, 房屋编号)"""
+    guest, landlord = make_users(2)
+    house, = make_houses(1, [landlord])
+    begin = datetime.datetime(2026, 11, 1)
+    with app.app_context():
+        db.session.add(Order(house_id=house.id, user_id=guest.id, begin_date=begin, end_date=begin, days=1,
+                             house_price=house.price, amount=house.price))
+        db.session.commit()
+    return guest.id, house.id
+
+
+def _orders(client):
+    resp = client.get('/api/v1.0/user/orders').get_json()
+    assert resp['errno'] == '0', resp
+    return resp['data']['orders']
+
+
+def test_read_only_view_uses_replica(app, dbs, order, login):
+    primary_log, replica_log = dbs
+    client = app.test_client()
+    login(client, order[0])
+    # 副本中没有数据，说明查询发送到了副本
+    assert _orders(client) == []
+    assert replica_log.take()
+    assert primary_log.take() == []
+
+
+def test_other_views_use_primary(app, dbs, order, login):
+    primary_log, replica_log = dbs
+    client = app.test_client()
+    login(client, order[0])
+    resp = client.get('/api/v1.0/user').get_json()
+    assert resp['data']['user_id'] == order[0]
+    assert primary_log.take()
+    assert replica_log.take() == []
+
+
+def test_use_primary_and_for_update(app, db, dbs, order):
+    from ihome_api.utils.routing import use_primary
+    primary_log, replica_log = dbs
+    with app.test_request_context():
+        g.db_read_only = True
+        assert House.query.all() == []
+        assert replica_log.take() and not primary_log.take()
+        # SELECT ... FOR UPDATE 总是使用主库
+        assert len(House.query.with_for_update().all()) == 1
+        assert primary_log.take() and not replica_log.take()
+        use_primary()
+        assert len(House.query.all()) == 1
+        assert primary_log.take() and not replica_log.take()
+
+
+@pytest.mark.parametrize('write', ['flush', 'bulk_update'])
+def test_reads_after_write_use_primary(app, db, dbs, order, write):
+    primary_log, replica_log = dbs
+    with app.test_request_context():
+        g.db_read_only = True
+        assert House.query.all() == []
+        assert replica_log.take()
+        if write == 'flush':
+            db.session.add(User(name='new', mobile='13700000000', password_hash='-'))
+            db.session.flush()
+        else:
+            House.query.filter(House.id == order[1]).update({House.title: 'changed'}, synchronize_session=False)
+        assert House.query.get(order[1]).title == ('changed' if write == 'bulk_update' else '阳光小屋0')
+        db.session.commit()
+        assert [house.id for house in House.query.all()] == [order[1]]
+        assert primary_log.take() and replica_log.take() == []
+
+
+@pytest.mark.parametrize('write', ['orm', 'bulk_update'])
+def test_sticky_primary_after_write(app, dbs, order, login, monkeypatch, write):
+    from ihome_api.utils.routing import PRIMARY_UNTIL_KEY
+    primary_log, replica_log = dbs
+    monkeypatch.setattr(contants, 'DB_PRIMARY_STICKY_SECONDS', 1)
+    client = app.test_client()
+    login(client, order[0])
+    assert _orders(client) == []
+
+    if write == 'orm':
+        # 下单，ORM 写入
+        resp = client.post('/api/v1.0/orders', json={
+            'house_id': order[1], 'start_date': '2026-12-01', 'end_date': '2026-12-02'}).get_json()
+    else:
+        # 修改用户名，直接执行 UPDATE
+        resp = client.put('/api/v1.0/users/name', json={'name': 'renamed'}).get_json()
+    assert resp['errno'] == '0', resp
+    with client.session_transaction() as sess:
+        assert sess[PRIMARY_UNTIL_KEY] > time.time()
+
+    # 写入后的一段时间内只读视图也使用主库，能读到主库中的订单
+    primary_log.take()
+    replica_log.take()
+    assert _orders(client)
+    assert primary_log.take() and replica_log.take() == []
+
+    # 超过时间后回到副本
+    time.sleep(2)
+    assert _orders(client) == []
+    assert replica_log.take() and primary_log.take() == []
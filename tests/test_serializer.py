@@ -0,0 +1,98 @@
+# coding:utf-8
+"""json 序列化的各实现输出相同的字节，标准库 json 不支持的数据两者都抛出 TypeError"""
+import dataclasses
+import datetime
+import enum
+import random
+import uuid
+import pytest
+from ihome_api.utils import serializer
+
+orjson = pytest.importorskip('orjson')
+
+CASES = [
+    {'errno': '0', 'errmsg': '成功', 'data': {'houses': [], 'total_page': 0}},
+    {'b': 1, 'a': [1, 2, {'d': None, 'c': True}], 'e': False},
+    {'title': '阳光小区 "两室" \\ 一厅\n\t \x7f/'},
+    {'price': 1.5, 'score': 0.1, 'zero': 0.0, 'negative': -2.25},
+    {'small': 1e-05},
+    {'smaller': 1.5e-07},
+    {'large': 1e+16},
+    {'larger': 1.2345e+22},
+    [1e-05, 1e+16, 100.0],
+    1e-05,
+    -1e+16,
+    {'big': 2 ** 70},
+    {'negative_big': -2 ** 70},
+    {'u64': 2 ** 64 - 1, 'i64': -2 ** 63},
+    {1: 'int key', 2: 'another int key'},
+    {'text': ':1.5 looks like a float'},
+    {'nan': float('nan')},
+    [float('inf'), float('-inf'), 1.5],
+    float('nan'),
+    {'nested': [{'value': float('inf')}]},
+]
+
+
+class Color(enum.Enum):
+    RED = 'red'
+
+
+class Level(enum.IntEnum):
+    LOW = 1
+
+
+class Name(str):
+    pass
+
+
+@dataclasses.dataclass
+class Point(object):
+    x: int
+    y: int
+
+
+# 标准库 json 按整数和字符串输出的子类
+SUBCLASS_CASES = [
+    {'level': Level.LOW},
+    {'name': Name('阳光小屋')},
+    [Level.LOW, Name('a'), {'b': [Level.LOW]}],
+]
+
+# 标准库 json 不支持，orjson 能直接序列化的类型
+UNSUPPORTED_CASES = [
+    {'day': datetime.date(2020, 1, 1)},
+    {'time': datetime.datetime(2020, 1, 1, 12, 30)},
+    [datetime.time(12, 30)],
+    {'id': uuid.UUID(int=1)},
+    {'color': Color.RED},
+    {'point': Point(1, 2)},
+    {'houses': [{'house_id': 1, 'ctime': datetime.datetime(2020, 1, 1)}]},
+]
+
+
+@pytest.mark.parametrize('obj', CASES + SUBCLASS_CASES)
+def test_backends_are_byte_identical(obj):
+    assert serializer.BACKENDS['orjson'](obj) == serializer.BACKENDS['json'](obj)
+
+
+def test_random_floats_are_byte_identical():
+    random.seed(0)
+    values = [random.choice((1, -1)) * random.random() * 10 ** random.uniform(-30, 30) for _ in range(20000)]
+    values += [float('%.3g' % value) for value in values]
+    assert serializer.BACKENDS['orjson'](values) == serializer.BACKENDS['json'](values)
+    for value in values:
+        assert serializer.BACKENDS['orjson']({'value': value}) == serializer.BACKENDS['json']({'value': value})
+
+
+def test_orjson_output_for_plain_payload():
+    # 不含浮点数和大整数时使用 orjson 的输出
+    obj = {'houses': [{'house_id': i, 'title': '房屋%s' % i} for i in range(3)]}
+    assert serializer.BACKENDS['orjson'](obj) == orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode('utf-8')
+
+
+@pytest.mark.parametrize('obj', UNSUPPORTED_CASES + [{'value': object()}])
+def test_unsupported_type_raises_type_error(obj):
+    for name in ('json', 'orjson'):
+        with pytest.raises(TypeError):
+            serializer.BACKENDS[name](obj)
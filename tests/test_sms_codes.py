@@ -0,0 +1,73 @@
+# coding:utf-8
+"""短信验证码的发送频率限制：同一个手机号只有短信发送成功后才占用发送次数"""
+import pytest
+from ihome_api.utils.response_code import RET
+
+MOBILE = '13912345678'
+
+
+class FakeResult(object):
+    def __init__(self, ret):
+        self.ret = ret
+
+    def get(self):
+        if isinstance(self.ret, Exception):
+            raise self.ret
+        return self.ret
+
+
+@pytest.fixture
+def send_sms(app, db, monkeypatch):
+    """请求发送短信验证码，sms 的返回值为发送结果（0 成功，-1 失败）或发送时抛出的异常"""
+    from ihome_api import redis_store
+    from ihome_api.tasks.sms import tasks
+    monkeypatch.setitem(app.config, 'RATE_LIMIT_ENABLED', True)
+    client = app.test_client()
+    sent = []
+
+    def send_sms(ret):
+        redis_store.setex('image_code_1', 60, 'ABCD')
+        monkeypatch.setattr(tasks.send_template_sms, 'delay', lambda *args: sent.append(args) or FakeResult(ret))
+        return client.get('/api/v1.0/sms_codes/%s?image_code=abcd&image_code_id=1' % MOBILE).get_json()['errno']
+
+    send_sms.sent = sent
+    return send_sms
+
+
+def test_sms_code_interval(send_sms):
+    assert send_sms(0) == RET.OK
+    assert send_sms(0) == RET.REQERR
+    assert len(send_sms.sent) == 1
+
+
+@pytest.mark.parametrize('ret, errno', [(-1, RET.OK), (RuntimeError('broker down'), RET.THIRDERR)])
+def test_failed_send_does_not_use_interval(send_sms, ret, errno):
+    assert send_sms(ret) == errno
+    # 没有发送成功，可以马上重试
+    assert send_sms(0) == RET.OK
+    assert send_sms(0) == RET.REQERR
+    assert len(send_sms.sent) == 2
+
+
+def test_registered_mobile_does_not_use_interval(app, db, send_sms):
+    from ihome_api.models import User
+    with app.app_context():
+        db.session.add(User(name='registered', mobile=MOBILE, password_hash='-'))
+        db.session.commit()
+    assert send_sms(0) == RET.DATAEXIST
+    with app.app_context():
+        User.query.delete()
+        db.session.commit()
+    assert send_sms(0) == RET.OK
+
+
+def test_refund_does_not_exceed_capacity(app, db, monkeypatch):
+    from ihome_api.utils.rate_limit import consume, refund
+    monkeypatch.setitem(app.config, 'RATE_LIMIT_ENABLED', True)
+    with app.test_request_context():
+        assert consume('test', 'key', 2, 60) == (True, 0)
+        refund('test', 'key', 2, 60)
+        refund('test', 'key', 2, 60)
+        assert consume('test', 'key', 2, 60)[0]
+        assert consume('test', 'key', 2, 60)[0]
+        assert not consume('test', 'key', 2, 60)[0]